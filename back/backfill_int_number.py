@@ -0,0 +1,26 @@
+from services.card_index import card_sort_key
+from services.firestore import FirestoreService
+
+BATCH_SIZE = 500
+
+# Store the int_number sort key on the cards imported before the importers wrote it.
+# Cards without it are skipped by the paginated GET /api/sets/{id}/cards.
+firestore_service = FirestoreService()
+
+documents = firestore_service.query_documents('series')
+
+for i, document in enumerate(documents):
+    print(f"{i + 1}/{len(documents)}: {document.get('serie_name')}")
+    cards = firestore_service.query_sub_collection(
+        'series',
+        document.get('_id'),
+        'cards'
+    )
+
+    updates = [card for card in cards if card.get('int_number') != card_sort_key(card.get('card_number'))]
+    for j in range(0, len(updates), BATCH_SIZE):
+        batch = firestore_service.db.batch()
+        for card in updates[j:j + BATCH_SIZE]:
+            batch.update(card.get('ref'), {'int_number': card_sort_key(card.get('card_number'))})
+        batch.commit()
+    print(f"Updated {len(updates)} cards from serie: {document.get('serie_name')}")
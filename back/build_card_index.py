@@ -0,0 +1,43 @@
+
+from services.card_index import CARD_INDEX_COLLECTION, card_index_id, normalize_card_number
+from services.firestore import FirestoreService
+
+BATCH_SIZE = 500
+
+# Rebuild the card_index collection from the existing series and cards.
+# The importers keep it up to date afterwards.
+firestore_service = FirestoreService()
+
+documents = firestore_service.query_documents('series')
+
+for i, document in enumerate(documents):
+    print(f"{i + 1}/{len(documents)}: {document.get('serie_name')}")
+    cards = firestore_service.query_sub_collection(
+        'series',
+        document.get('_id'),
+        'cards'
+    )
+
+    entries = {}
+    for card in cards:
+        doc_id = card_index_id(document.get('licence'), document.get('set_id'), card.get('card_number'))
+        if doc_id not in entries:
+            entries[doc_id] = {
+                'licence': document.get('licence'),
+                'set_id': document.get('set_id'),
+                'card_number': normalize_card_number(card.get('card_number')),
+                'series_id': document.get('_id'),
+                'versions': []
+            }
+        ref = card.pop('ref')
+        entries[doc_id]['versions'].append({**card, 'ref': ref.path})
+
+    doc_ids = list(entries)
+    for j in range(0, len(doc_ids), BATCH_SIZE):
+        chunk = doc_ids[j:j + BATCH_SIZE]
+        firestore_service.batch_set_documents(
+            CARD_INDEX_COLLECTION,
+            [entries[doc_id] for doc_id in chunk],
+            chunk
+        )
+    print(f"Indexed {len(doc_ids)} cards from serie: {document.get('serie_name')}")
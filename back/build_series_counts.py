@@ -0,0 +1,42 @@
+from services.firestore import FirestoreService
+
+BATCH_SIZE = 500
+
+# Store the number of cards of every series (card_count) and the number of
+# distinct cards each user owns per series (collections/{email}/series_counts).
+# The importers and the collection write path keep them up to date afterwards,
+# collections are flagged with series_counts_built once their counters are complete.
+firestore_service = FirestoreService()
+
+series = firestore_service.query_documents('series')
+
+for i, serie in enumerate(series):
+    card_count = len(list(
+        firestore_service.get_collection_ref('series').document(serie.get('_id')).collection('cards').list_documents()
+    ))
+    firestore_service.update_document('series', serie.get('_id'), {'card_count': card_count})
+    print(f"{i + 1}/{len(series)}: {serie.get('serie_name')} has {card_count} cards")
+
+users = list(firestore_service.get_collection_ref('collections').list_documents())
+
+for i, user in enumerate(users):
+    owned = {}
+    for user_card in firestore_service.query_sub_collection('collections', user.id, 'cards'):
+        card_ref = user_card.get('card_ref')
+        if card_ref and user_card.get('count', 0) > 0:
+            series_id = card_ref.path.split('/')[1]
+            owned[series_id] = owned.get(series_id, 0) + 1
+
+    # Reset the series the user does not own any card of anymore
+    for counter in user.collection('series_counts').list_documents():
+        owned.setdefault(counter.id, 0)
+
+    series_ids = list(owned)
+    for j in range(0, len(series_ids), BATCH_SIZE):
+        batch = firestore_service.db.batch()
+        for series_id in series_ids[j:j + BATCH_SIZE]:
+            batch.set(user.collection('series_counts').document(series_id), {'owned': owned[series_id]})
+        batch.commit()
+    # Readers only trust the counters of a collection once this is set
+    user.set({'series_counts_built': True}, merge=True)
+    print(f"{i + 1}/{len(users)}: {user.id} owns cards in {sum(1 for c in owned.values() if c)} series")
@@ -1,3 +1,65 @@
+import os
+
+# Number of Firestore clients (and gRPC channels) shared by the whole process
+FIRESTORE_POOL_SIZE = int(os.getenv("FIRESTORE_POOL_SIZE", "4"))
+
+# Catalog (series and cards) cache, invalidated by the importers after they write.
+# Each instance has its own cache: an invalidation only reaches the instance receiving it.
+CATALOG_CACHE_TTL_SECONDS = int(os.getenv("CATALOG_CACHE_TTL_SECONDS", "3600"))
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "512"))
+CATALOG_INVALIDATION_TOKEN = os.getenv("CATALOG_INVALIDATION_TOKEN")
+# Card index entries read by scans, in their own cache so they never evict the catalog
+CARD_INDEX_CACHE_MAX_ENTRIES = int(os.getenv("CARD_INDEX_CACHE_MAX_ENTRIES", "20000"))
+
+# Per-user collection summary cache, dropped on the user's collection updates
+SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("SUMMARY_CACHE_TTL_SECONDS", "300"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1000"))
+
+# Ownership reads: card ids per get_all, and max get_all in flight for the whole process
+OWNERSHIP_BATCH_SIZE = int(os.getenv("OWNERSHIP_BATCH_SIZE", "300"))
+OWNERSHIP_MAX_CONCURRENCY = int(os.getenv("OWNERSHIP_MAX_CONCURRENCY", "16"))
+
+# Gemini calls: max in-flight calls per process, per-call deadline and retries on 429/5xx
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1"))
+
+# Uploaded pictures: read in chunks, size limit, and normalization before the model call
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+IMAGE_MAX_LONG_EDGE = int(os.getenv("IMAGE_MAX_LONG_EDGE", "2048"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+# Tiling mode of /api/cards/read: min card area (fraction of the picture) and crops quality
+TILING_MIN_CARD_AREA = float(os.getenv("TILING_MIN_CARD_AREA", "0.02"))
+TILING_JPEG_QUALITY = int(os.getenv("TILING_JPEG_QUALITY", "90"))
+
+# Scan results cache keyed by perceptual hash: "memory", "disk" (SQLite file) or "none"
+SCAN_CACHE_BACKEND = os.getenv("SCAN_CACHE_BACKEND", "memory")
+SCAN_CACHE_PATH = os.getenv("SCAN_CACHE_PATH", "/tmp/scan_cache.sqlite3")
+SCAN_CACHE_TTL_SECONDS = int(os.getenv("SCAN_CACHE_TTL_SECONDS", "86400"))
+SCAN_CACHE_MAX_ENTRIES = int(os.getenv("SCAN_CACHE_MAX_ENTRIES", "1000"))
+# Max differing bits (out of 256) for two pictures to be considered the same scan
+SCAN_CACHE_MAX_DISTANCE = int(os.getenv("SCAN_CACHE_MAX_DISTANCE", "8"))
+
+# Local OCR of the printed set id and card number, skipping the model when it is legible
+OCR_FAST_PATH = os.getenv("OCR_FAST_PATH", "true").lower() == "true"
+# Min mean tesseract confidence (0-100) of the words read to trust a code
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "70"))
+
+# Batch scans: background workers, job store ("memory" or "disk" SQLite file) and retention
+SCAN_JOB_WORKERS = int(os.getenv("SCAN_JOB_WORKERS", "4"))
+SCAN_JOB_STORE = os.getenv("SCAN_JOB_STORE", "memory")
+SCAN_JOB_PATH = os.getenv("SCAN_JOB_PATH", "/tmp/scan_jobs.sqlite3")
+SCAN_JOB_TTL_SECONDS = int(os.getenv("SCAN_JOB_TTL_SECONDS", "86400"))
+SCAN_JOB_MAX_PICTURES = int(os.getenv("SCAN_JOB_MAX_PICTURES", "200"))
+# Batch scan limits: bytes of one batch request, and pictures waiting to be processed
+# by the process, in bytes and per user (answered with 503 and 429 once reached)
+SCAN_JOB_MAX_BYTES = int(os.getenv("SCAN_JOB_MAX_BYTES", str(200 * 1024 * 1024)))
+SCAN_JOB_MAX_QUEUED_BYTES = int(os.getenv("SCAN_JOB_MAX_QUEUED_BYTES", str(1024 * 1024 * 1024)))
+SCAN_JOB_MAX_QUEUED_PER_USER = int(os.getenv("SCAN_JOB_MAX_QUEUED_PER_USER", "400"))
+
 CARD_DETECTION_PROMPT = """
 
 **You are an expert assistant specialized in identifying Trading Card Game (TCG) cards from images or text descriptions, specifically from the pokemon and one piece licenses.**
@@ -1,12 +1,34 @@
+import asyncio
 import json
-from fastapi import UploadFile
+import random
+from typing import AsyncIterator, Optional, Tuple
+from fastapi import HTTPException, UploadFile
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from google.auth import default
 
-from config import CARD_DETECTION_PROMPT, RESPONSE_SCHEMA
+from config import (
+    CARD_DETECTION_PROMPT,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_BASE_DELAY,
+    GEMINI_TIMEOUT_SECONDS,
+    OCR_FAST_PATH,
+    OCR_MIN_CONFIDENCE,
+    RESPONSE_SCHEMA,
+    SCAN_JOB_WORKERS,
+)
 from models.card import Cards
-from services.firestore import FirestoreService
+from services.async_firestore import IN_QUERY_LIMIT, get_async_firestore_service
+from services.card_index import lookup_card_index, normalize_card_number, normalize_set_id
+from services.card_detection import crop_regions, detect_card_regions, single_card_picture
+from services.image_processing import preprocess_image, read_upload
+from services.json_stream import JsonArrayStreamParser
+from services.ocr import OCR_AVAILABLE, read_card_code
+from services.scan_cache import scan_cache
+from services.scan_jobs import ScanJobQueue, create_job_store
+from controllers.collection_controller import get_owned_counts
+from controllers.sets_controller import get_all_sets
 
 _, project = default()
 
@@ -17,69 +39,314 @@ client = genai.Client(
 )
 
 
-def generate(image: UploadFile) -> Cards:
+# Shared by every request of the process to bound concurrent model calls
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
 
-    msg1_image1 = types.Part.from_bytes(
-        data=image.file.read(),
-        mime_type="image/jpeg",
-    )
-    si_text1 = CARD_DETECTION_PROMPT
+# HTTP codes worth retrying: quota exhausted and transient server errors
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+MODEL = "gemini-2.5-flash"
+
+GENERATE_CONTENT_CONFIG = types.GenerateContentConfig(
+    temperature=0,
+    top_p=1,
+    seed=0,
+    max_output_tokens=65535,
+    safety_settings=[types.SafetySetting(
+        category="HARM_CATEGORY_HATE_SPEECH",
+        threshold="OFF"
+    ), types.SafetySetting(
+        category="HARM_CATEGORY_DANGEROUS_CONTENT",
+        threshold="OFF"
+    ), types.SafetySetting(
+        category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        threshold="OFF"
+    ), types.SafetySetting(
+        category="HARM_CATEGORY_HARASSMENT",
+        threshold="OFF"
+    )],
+    response_mime_type="application/json",
+    response_schema=RESPONSE_SCHEMA,
+    system_instruction=[types.Part.from_text(text=CARD_DETECTION_PROMPT)],
+)
 
-    model = "gemini-2.5-flash"
-    contents = [
+
+def build_contents(data: bytes, mime_type: str) -> list:
+    """
+    Build the model request contents for a picture
+    """
+    return [
         types.Content(
             role="user",
             parts=[
-                msg1_image1,
+                types.Part.from_bytes(
+                    data=data,
+                    mime_type=mime_type,
+                ),
                 types.Part.from_text(
                  text="""extract the cards of this picture""")
             ]
         ),
     ]
 
-    generate_content_config = types.GenerateContentConfig(
-        temperature=0,
-        top_p=1,
-        seed=0,
-        max_output_tokens=65535,
-        safety_settings=[types.SafetySetting(
-            category="HARM_CATEGORY_HATE_SPEECH",
-            threshold="OFF"
-        ), types.SafetySetting(
-            category="HARM_CATEGORY_DANGEROUS_CONTENT",
-            threshold="OFF"
-        ), types.SafetySetting(
-            category="HARM_CATEGORY_SEXUALLY_EXPLICIT",
-            threshold="OFF"
-        ), types.SafetySetting(
-            category="HARM_CATEGORY_HARASSMENT",
-            threshold="OFF"
-        )],
-        response_mime_type="application/json",
-        response_schema=RESPONSE_SCHEMA,
-        system_instruction=[types.Part.from_text(text=si_text1)],
-    )
 
-    response = client.models.generate_content(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    )
+async def generate(image: UploadFile, tiling: bool = False, firestore_service=None) -> Cards:
+    """
+    Read the cards of an uploaded picture with the model, unless a near-identical
+    picture was scanned recently.
+    With tiling and a firestore_service, cards whose code is legible are read locally by OCR.
+    """
+    data, mime_type = await read_picture(image)
+    return await generate_from_picture(data, mime_type, tiling, firestore_service)
+
+
+async def generate_from_picture(data: bytes, mime_type: str, tiling: bool = False, firestore_service=None) -> Cards:
+    """
+    Read the cards of a preprocessed picture, going through the scan cache.
+    The cache only holds single model calls: tiled pictures, read card by card
+    and partly by OCR, bypass it.
+    """
+    if not scan_cache or tiling:
+        return await recognize(data, mime_type, tiling, firestore_service)
+
+    key, cards = await asyncio.to_thread(scan_cache.lookup, data)
+    if cards is not None:
+        return cards
+
+    cards = await recognize(data, mime_type, tiling, firestore_service)
+    await asyncio.to_thread(scan_cache.store, key, cards)
+    return cards
+
+
+async def read_picture(image: UploadFile) -> Tuple[bytes, str]:
+    """
+    Read and preprocess an uploaded picture
+
+    Returns:
+        The picture bytes and their mime type
+    """
+    return await asyncio.to_thread(preprocess_image, await read_upload(image))
+
+
+async def recognize(data: bytes, mime_type: str, tiling: bool, firestore_service=None) -> Cards:
+    """
+    Read the cards of a preprocessed picture.
+
+    When the OCR fast path is on, card codes are read locally by OCR and checked
+    against the card index, cards not read this way going to the model:
+    - without tiling, a picture of a single card is read by OCR, any other
+      picture or unread card goes to the model in one call,
+    - with tiling, cards are detected and each one is read by OCR or, failing
+      that, by its own model call. A picture with less than two detected cards
+      is read like without tiling.
+    """
+    use_ocr = OCR_FAST_PATH and OCR_AVAILABLE and firestore_service is not None
+    if not tiling:
+        return await recognize_single(data, mime_type, firestore_service if use_ocr else None)
+
+    regions = await asyncio.to_thread(detect_card_regions, data)
+    if len(regions) < 2:
+        # Nothing detected or a single box, which may as well be the whole picture
+        return await recognize_single(data, mime_type, firestore_service if use_ocr else None, regions)
+
+    crops = await asyncio.to_thread(crop_regions, data, regions)
+    read = [None] * len(crops)
+    if use_ocr:
+        read = await read_cards_locally(crops, firestore_service)
+
+    async def read_crop(crop, card):
+        return [card] if card else await generate_from_bytes(crop, "image/jpeg")
+
+    results = await asyncio.gather(*(read_crop(crop, card) for crop, card in zip(crops, read)))
+    return [card for cards in results for card in cards]
+
+
+async def recognize_single(data: bytes, mime_type: str, firestore_service=None, regions=None) -> Cards:
+    """
+    Read a picture in one go: by OCR when it shows a single card whose code is
+    legible (only with a firestore_service), with one model call otherwise.
+    regions are the detected cards of the picture, when already known.
+    """
+    if firestore_service is not None:
+        card_picture = await asyncio.to_thread(single_card_picture, data, regions)
+        if card_picture is not None:
+            card = (await read_cards_locally([card_picture], firestore_service))[0]
+            if card:
+                return [card]
+    return await generate_from_bytes(data, mime_type)
+
+
+async def read_cards_locally(crops: list, firestore_service) -> list:
+    """
+    Read the set id and card number of each card picture by OCR.
+
+    A read is kept only above OCR_MIN_CONFIDENCE and when the card exists in
+    the card index, so a misread code never reaches the user.
+
+    Returns:
+        One card dict per picture, None for the ones to send to the model
+    """
+    codes = await asyncio.gather(*(asyncio.to_thread(read_card_code, crop) for crop in crops))
+    codes = [
+        code if code and code['confidence'] >= OCR_MIN_CONFIDENCE else None
+        for code in codes
+    ]
+
+    keys = [
+        (code['licence'], normalize_set_id(code['set_id']), normalize_card_number(code['card_number']))
+        for code in codes if code
+    ]
+    indexed = await lookup_card_index(keys, firestore_service) if keys else {}
+
+    cards = []
+    for code in codes:
+        versions = indexed.get((
+            code['licence'], normalize_set_id(code['set_id']), normalize_card_number(code['card_number'])
+        )) if code else None
+        if not versions:
+            cards.append(None)
+            continue
+        cards.append({
+            'set_id': code['set_id'],
+            'card_number': code['card_number'],
+            'card_name': versions[0].get('card_name'),
+            'licence': code['licence']
+        })
+    return cards
+
+
+async def generate_from_bytes(data: bytes, mime_type: str) -> Cards:
+    """
+    Read the cards of a picture with the model.
+
+    At most GEMINI_MAX_CONCURRENCY calls run at once in the process, each one is
+    cancelled after GEMINI_TIMEOUT_SECONDS, and quota or server errors are
+    retried up to GEMINI_MAX_RETRIES times with jittered exponential backoff.
+    """
+    contents = build_contents(data, mime_type)
+
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        try:
+            async with gemini_semaphore:
+                response = await asyncio.wait_for(
+                    client.aio.models.generate_content(
+                        model=MODEL,
+                        contents=contents,
+                        config=GENERATE_CONTENT_CONFIG,
+                    ),
+                    timeout=GEMINI_TIMEOUT_SECONDS
+                )
+            return json.loads(response.text)
+        except asyncio.TimeoutError:
+            if attempt == GEMINI_MAX_RETRIES:
+                raise HTTPException(status_code=504, detail="Card recognition timed out")
+        except errors.APIError as e:
+            if e.code not in RETRYABLE_CODES:
+                raise
+            if attempt == GEMINI_MAX_RETRIES:
+                raise HTTPException(status_code=503, detail="Card recognition is unavailable, retry later")
+
+        # Full jitter spreads the retries of concurrent scans hitting the same quota
+        await asyncio.sleep(random.uniform(0, GEMINI_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+async def generate_stream(data: bytes, mime_type: str) -> AsyncIterator[dict]:
+    """
+    Read the cards of a preprocessed picture with a streamed model response,
+    yielding each card as soon as its JSON object is complete.
 
-    data = response.text
-    return json.loads(data)
+    A recent near-identical scan is replayed from the scan cache. Errors are
+    retried like generate_from_bytes as long as no card was yielded yet.
+    """
+    key = None
+    if scan_cache:
+        key, cards = await asyncio.to_thread(scan_cache.lookup, data)
+        if cards is not None:
+            for card in cards:
+                yield card
+            return
 
+    contents = build_contents(data, mime_type)
+    cards = []
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        queue: "asyncio.Queue[Optional[dict]]" = asyncio.Queue()
+        producer = asyncio.create_task(stream_cards(contents, queue))
+        try:
+            while (card := await queue.get()) is not None:
+                # Copied, the caller may modify the yielded card before it is cached
+                cards.append(dict(card))
+                yield card
+            # Raise the error that ended the stream, if any
+            await producer
+            break
+        except asyncio.TimeoutError:
+            if cards or attempt == GEMINI_MAX_RETRIES:
+                raise HTTPException(status_code=504, detail="Card recognition timed out")
+        except errors.APIError as e:
+            if cards or e.code not in RETRYABLE_CODES:
+                raise
+            if attempt == GEMINI_MAX_RETRIES:
+                raise HTTPException(status_code=503, detail="Card recognition is unavailable, retry later")
+        finally:
+            # The caller may stop reading before the end of the stream
+            producer.cancel()
 
-def find_card_in_firestore(card_number, set_id, firestore_service=None, cache_series={}):
+        await asyncio.sleep(random.uniform(0, GEMINI_RETRY_BASE_DELAY * 2 ** attempt))
+
+    if scan_cache:
+        await asyncio.to_thread(scan_cache.store, key, cards)
+
+
+async def stream_cards(contents: list, queue: asyncio.Queue):
+    """
+    Stream the model response, putting each card in queue as soon as its JSON
+    object is complete, then None. Only the model stream holds a gemini_semaphore
+    slot: the cards are consumed at the caller's pace, outside of it.
+    """
+    try:
+        async with gemini_semaphore, asyncio.timeout(GEMINI_TIMEOUT_SECONDS):
+            parser = JsonArrayStreamParser()
+            stream = await client.aio.models.generate_content_stream(
+                model=MODEL,
+                contents=contents,
+                config=GENERATE_CONTENT_CONFIG,
+            )
+            async for chunk in stream:
+                for card in parser.feed(chunk.text or ''):
+                    queue.put_nowait(card)
+    finally:
+        queue.put_nowait(None)
+
+
+async def find_card_in_firestore(card_number, set_id, firestore_service=None, cache_series=None, licence=None):
+    """
+    Find every version of a card, from the card index first and by querying
+    the series and its cards as a fallback for cards not indexed yet
+    """
     if not firestore_service:
-        firestore_service = FirestoreService()
+        firestore_service = get_async_firestore_service()
+    if cache_series is None:
+        cache_series = {}
 
+    indexed = await lookup_card_index([(licence, set_id, card_number)], firestore_service)
+    card_data = indexed[(licence, set_id, card_number)]
+    if card_data:
+        return card_data, cache_series
+
+    return await find_card_in_series(card_number, set_id, firestore_service, cache_series)
+
+
+async def find_card_in_series(card_number, set_id, firestore_service, cache_series):
+    """
+    Find every version of a card by querying its series then the series cards.
+    cache_series maps already resolved set ids to their series document id.
+    """
     if set_id in cache_series:
         set_doc = {
             "_id": cache_series[set_id]
         }
     else:
-        set_doc = firestore_service.query_documents(
+        set_doc = await firestore_service.query_documents(
             'series',
             filters=[
                 ("set_id", "==", set_id)
@@ -92,7 +359,7 @@ def find_card_in_firestore(card_number, set_id, firestore_service=None, cache_se
         set_doc = set_doc[0]
         cache_series[set_id] = set_doc.get('_id')
 
-    card_data = firestore_service.query_sub_collection(
+    card_data = await firestore_service.query_sub_collection(
         "series",
         set_doc.get('_id'),
         "cards",
@@ -105,3 +372,131 @@ def find_card_in_firestore(card_number, set_id, firestore_service=None, cache_se
         return None, cache_series
 
     return card_data, cache_series
+
+
+async def resolve_cards_from_series(keys, firestore_service):
+    """
+    Resolve (licence, set_id, card_number) keys by querying the series cards.
+
+    Keys are grouped by set and fetched with chunked 'in' queries, all sets in
+    parallel, so the number of round trips grows with the number of sets
+    instead of the number of cards.
+
+    Returns:
+        Dictionary mapping each key to the list of its card versions (empty if not found)
+    """
+    # Map set ids to series document ids from the cached series list
+    series_ids = {}
+    for serie in await get_all_sets(firestore_service):
+        series_ids.setdefault(serie.get('set_id'), serie.get('_id'))
+
+    numbers_by_set = {}
+    for licence, set_id, card_number in keys:
+        if set_id in series_ids:
+            numbers_by_set.setdefault(set_id, set()).add(card_number)
+        else:
+            print(f"set not found: {set_id}")
+
+    def fetch_chunk(set_id, numbers):
+        return firestore_service.query_sub_collection(
+            "series",
+            series_ids[set_id],
+            "cards",
+            filters=[
+                ("card_number", "in", numbers)
+            ]
+        )
+
+    chunks = []
+    for set_id, numbers in numbers_by_set.items():
+        numbers = sorted(numbers)
+        for i in range(0, len(numbers), IN_QUERY_LIMIT):
+            chunks.append((set_id, numbers[i:i + IN_QUERY_LIMIT]))
+
+    chunk_results = await asyncio.gather(*(fetch_chunk(set_id, numbers) for set_id, numbers in chunks))
+
+    versions = {}
+    for (set_id, _), cards in zip(chunks, chunk_results):
+        for card in cards:
+            versions.setdefault((set_id, card.get('card_number')), []).append(card)
+
+    return {
+        key: versions.get((key[1], key[2]), [])
+        for key in keys
+    }
+
+
+async def process_scan_job(data: bytes, mime_type: str, email: str, tiling: bool) -> list:
+    """
+    Preprocess, read and resolve the cards of one uploaded picture of a batch
+    scan job. mime_type is the declared one, the real format is sniffed.
+    """
+    firestore_service = get_async_firestore_service()
+    warm_up = asyncio.create_task(warm_up_scan(firestore_service))
+    data, mime_type = await asyncio.to_thread(preprocess_image, data)
+    cards_read = await generate_from_picture(data, mime_type, tiling, firestore_service)
+    await warm_up
+    return await resolve_scanned_cards(cards_read, email, firestore_service)
+
+
+scan_jobs = ScanJobQueue(create_job_store(), process_scan_job, SCAN_JOB_WORKERS)
+
+
+async def warm_up_scan(firestore_service):
+    """
+    Load what card resolution may need (the series list used by the fallback
+    path) into the catalog cache while the model is still reading the picture.
+    Failures are not fatal: resolution loads it again if needed.
+    """
+    try:
+        await get_all_sets(firestore_service)
+    except Exception as e:
+        print(f"scan warm up failed: {e}")
+
+
+async def resolve_scanned_cards(cards_read: list, email: str, firestore_service) -> list:
+    """
+    Attach the versions of every card read by the model, with the user's owned count.
+
+    Ownership of the cards found in the card index is fetched while the cards
+    missing from the index are resolved from their series, then only the
+    ownership of those late cards remains to be read.
+    """
+    # Normalize data the same way the card index does (e.g. "078" -> "78")
+    for card in cards_read:
+        card['card_number'] = normalize_card_number(card.get('card_number'))
+        card['set_id'] = normalize_set_id(card.get('set_id'))
+
+    keys = list(dict.fromkeys(
+        (card.get('licence'), card['set_id'], card['card_number']) for card in cards_read
+    ))
+
+    resolved = await lookup_card_index(keys, firestore_service)
+    missing = [key for key in keys if not resolved.get(key)]
+
+    indexed_refs = [c.get('ref') for versions in resolved.values() if versions for c in versions]
+    owned_counts, from_series = await asyncio.gather(
+        get_owned_counts(indexed_refs, email, firestore_service),
+        resolve_cards_from_series(missing, firestore_service) if missing else asyncio.sleep(0, {})
+    )
+
+    resolved.update(from_series)
+    if from_series:
+        owned_counts.update(await get_owned_counts(
+            [c.get('ref') for versions in from_series.values() for c in versions],
+            email,
+            firestore_service
+        ))
+
+    for card in cards_read:
+        card_data = resolved[(card.get('licence'), card['set_id'], card['card_number'])] or []
+        card['card_versions'] = [
+            {
+                **c,
+                'ref': c.get('ref').path,
+                'licence': card.get('licence'),
+                'count': owned_counts.get(c.get('ref').path, 0)
+            } for c in card_data
+        ]
+
+    return cards_read
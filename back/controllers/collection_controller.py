@@ -1,112 +1,334 @@
-from typing import List
+import asyncio
+import re
+from typing import Dict, List
 
 from fastapi import HTTPException
-from services.firestore import FirestoreService
+from google.cloud import firestore
+from config import (
+    OWNERSHIP_BATCH_SIZE,
+    OWNERSHIP_MAX_CONCURRENCY,
+    SUMMARY_CACHE_MAX_ENTRIES,
+    SUMMARY_CACHE_TTL_SECONDS,
+)
+from services.async_firestore import AsyncFirestoreService
+from services.catalog_cache import CatalogCache
 
+# Cards applied per transaction, well under the 500 writes limit
+COLLECTION_CHUNK_SIZE = 200
 
-def update_cards_in_collection(cards: List[dict], email: str):
+# Maximum number of writes of a Firestore transaction
+TRANSACTION_MAX_WRITES = 500
+
+# Field of collections/{email} set once its series_counts are complete, by
+# build_series_counts.py or by the first collection write seeding them
+SERIES_COUNTS_BUILT = 'series_counts_built'
+
+# Collection summaries keyed by ("summary", email, licence)
+summary_cache = CatalogCache(max_entries=SUMMARY_CACHE_MAX_ENTRIES, ttl=SUMMARY_CACHE_TTL_SECONDS)
+
+# Shared by every request of the process to bound concurrent ownership reads
+ownership_semaphore = asyncio.Semaphore(OWNERSHIP_MAX_CONCURRENCY)
+
+# Path of a card document: series/{series_id}/cards/{card_id}
+CARD_PATH = re.compile(r'series/[^/]+/cards/[^/]+')
+
+
+def validate_card_path(card_path) -> str:
+    """
+    Check that a card ref is the path of a card document, raising a 400 otherwise
+
+    Returns:
+        The path without surrounding slashes
+    """
+    if not isinstance(card_path, str) or not CARD_PATH.fullmatch(card_path.strip('/')):
+        raise HTTPException(status_code=400, detail=f"Invalid card ref: {card_path}")
+    return card_path.strip('/')
+
+
+def collection_card_id(card_path: str) -> str:
+    """
+    Deterministic ID of the collection entry of a card, derived from the card ref path
+    (e.g. "series/abc/cards/def" -> "series_abc_cards_def")
     """
-    Controller function to update a document in a collection
+    return card_path.strip('/').replace('/', '_')
+
+
+def card_series_id(card_path: str) -> str:
+    """
+    ID of the series of a card, from its ref path (e.g. "series/abc/cards/def" -> "abc")
+    """
+    return card_path.strip('/').split('/')[1]
+
+
+async def apply_collection_deltas(cards: List[dict], email: str, firestore_service: AsyncFirestoreService) -> List[dict]:
     """
-    firestore_service = FirestoreService()
+    Add or remove many cards of a user's collection.
 
+    Each card is a dict with its 'ref' path, an optional 'licence' and an optional
+    'delta' (number of copies to add, negative to remove, 1 by default). Deltas of
+    the same card are aggregated first, then applied in transactions of at most
+    COLLECTION_CHUNK_SIZE cards, so concurrent updates of a card never lose counts.
+
+    The number of distinct cards owned in each series is maintained in the same
+    transactions, in collections/{email}/series_counts/{series_id}. Counters of a
+    collection not backfilled yet are first seeded from its cards.
+
+    Refs that are not card paths, or deltas that are not integers, are rejected with a 400.
+
+    Returns:
+        One result per distinct card: its ref, its new count and a status
+        ("ok", "not_owned"/"insufficient" when removing more copies than owned,
+        or "not_found" when adding a card that does not exist)
+    """
+    if not isinstance(cards, list) or not all(isinstance(card, dict) for card in cards):
+        raise HTTPException(status_code=400, detail="cards must be a list of cards")
+
+    deltas = {}
     for card in cards:
+        card_path = validate_card_path(card.get('ref'))
+        delta = card.get('delta', 1)
+        if not isinstance(delta, int) or isinstance(delta, bool):
+            raise HTTPException(status_code=400, detail=f"Invalid delta for {card_path}: {delta}")
+        if card_path not in deltas:
+            deltas[card_path] = {
+                'licence': card.get('licence'),
+                'delta': 0
+            }
+        deltas[card_path]['delta'] += delta
 
-        card_ref = firestore_service.db.document(card.get('ref'))
-        card_found = []
-        
-        if card_ref:
-            card_found = firestore_service.query_sub_collection(
-                collection_name='collections',
-                document_id=email,
-                sub_collection="cards",
-                filters=[
-                    ('card_ref', '==', card_ref)
-                ]
-            )
-        
-        if len(card_found) > 0:
-            firestore_service.update_sub_collection_document(
-                collection_name='collections',
-                document_id=email,
-                sub_collection="cards",
-                sub_document_id=card_found[0].get('_id'),
-                data={
-                    'count': card_found[0].get('count') + 1 if card_found[0].get('count') else 1
-                }
-            )
-        else:
-            firestore_service.create_sub_collection_document(
-                collection_name='collections',
-                document_id=email,
-                sub_collection='cards',
-                data={
-                    'card_ref': card_ref,
-                    'count': 1,
-                    'licence': card.get('licence')
-                }
-            )
-    
-    return True
+    card_paths = list(deltas)
+    results = []
+    for i in range(0, len(card_paths), COLLECTION_CHUNK_SIZE):
+        chunk = {card_path: deltas[card_path] for card_path in card_paths[i:i + COLLECTION_CHUNK_SIZE]}
+        transaction = firestore_service.db.transaction()
+        results.extend(await _apply_deltas_chunk(transaction, chunk, email, firestore_service))
+
+    summary_cache.invalidate("summary", email)
+    return results
+
+
+@firestore.async_transactional
+async def _apply_deltas_chunk(transaction, deltas: Dict[str, dict], email: str,
+                              firestore_service: AsyncFirestoreService) -> List[dict]:
+    """
+    Apply the deltas of a chunk of cards in a single transaction
+    """
+    collection_ref = firestore_service.db.collection('collections').document(email)
+    cards_ref = collection_ref.collection('cards')
+    counts_ref = collection_ref.collection('series_counts')
+    refs = {card_path: cards_ref.document(collection_card_id(card_path)) for card_path in deltas}
+
+    current = {}
+    async for snapshot in firestore_service.db.get_all(list(refs.values()), transaction=transaction):
+        current[snapshot.id] = snapshot.to_dict() if snapshot.exists else None
+
+    # Cards added to the collection must exist
+    added = [firestore_service.db.document(card_path) for card_path, change in deltas.items() if change['delta'] > 0]
+    existing = set()
+    if added:
+        async for snapshot in firestore_service.db.get_all(added, transaction=transaction):
+            if snapshot.exists:
+                existing.add(snapshot.reference.path)
+
+    collection_doc = await collection_ref.get(transaction=transaction)
+    counters_built = (collection_doc.to_dict() or {}).get(SERIES_COUNTS_BUILT, False)
+    if not counters_built:
+        # Owned count of every series from the cards, before this chunk
+        owned = {counter.id: 0 async for counter in counts_ref.stream(transaction=transaction)}
+        async for snapshot in cards_ref.stream(transaction=transaction):
+            user_card = snapshot.to_dict()
+            if user_card.get('card_ref') and user_card.get('count', 0) > 0:
+                series_id = card_series_id(user_card['card_ref'].path)
+                owned[series_id] = owned.get(series_id, 0) + 1
+
+    results = []
+    owned_changes = {}
+    for card_path, change in deltas.items():
+        doc_ref = refs[card_path]
+        user_card = current.get(doc_ref.id)
+        count = user_card.get('count', 0) if user_card else 0
+        new_count = count + change['delta']
+
+        if new_count < 0:
+            results.append({
+                'ref': card_path,
+                'count': count,
+                'status': 'insufficient' if user_card else 'not_owned'
+            })
+            continue
+        if change['delta'] > 0 and card_path not in existing:
+            results.append({
+                'ref': card_path,
+                'count': count,
+                'status': 'not_found'
+            })
+            continue
+
+        # A card counts once per series, whatever its number of copies
+        if (count > 0) != (new_count > 0):
+            series_id = card_series_id(card_path)
+            owned_changes[series_id] = owned_changes.get(series_id, 0) + (1 if new_count > 0 else -1)
 
+        if new_count == 0:
+            if user_card:
+                transaction.delete(doc_ref)
+        elif new_count != count:
+            transaction.set(doc_ref, {
+                'card_ref': firestore_service.db.document(card_path),
+                'series_id': card_series_id(card_path),
+                'licence': change['licence'] or (user_card or {}).get('licence'),
+                'count': new_count
+            })
 
-def delete_card_from_collection(card_path: str, email: str):
+        results.append({
+            'ref': card_path,
+            'count': new_count,
+            'status': 'ok'
+        })
+
+    if counters_built:
+        for series_id, owned_change in owned_changes.items():
+            if owned_change:
+                transaction.set(
+                    counts_ref.document(series_id),
+                    {'owned': firestore.Increment(owned_change)},
+                    merge=True
+                )
+    elif len(deltas) + len(owned) + len(owned_changes) + 1 <= TRANSACTION_MAX_WRITES:
+        for series_id, owned_change in owned_changes.items():
+            owned[series_id] = owned.get(series_id, 0) + owned_change
+        for series_id, owned_count in owned.items():
+            transaction.set(counts_ref.document(series_id), {'owned': owned_count})
+        transaction.set(collection_ref, {SERIES_COUNTS_BUILT: True}, merge=True)
+    # Otherwise the counters are left to build_series_counts.py, readers count the cards meanwhile
+
+    return results
+
+
+async def update_cards_in_collection(cards: List[dict], email: str, firestore_service: AsyncFirestoreService):
+    """
+    Controller function to add or remove cards of a user's collection
+    """
+    return await apply_collection_deltas(cards, email, firestore_service)
+
+
+async def delete_card_from_collection(card_path: str, email: str, firestore_service: AsyncFirestoreService):
     """
     Remove a card from a user's collection
     """
-    firestore_service = FirestoreService()
-    
-    card_ref = firestore_service.get_document_ref_by_path(card_path)
-    
-    if not card_ref:
+    card_path = validate_card_path(card_path)
+    result = (await apply_collection_deltas([{'ref': card_path, 'delta': -1}], email, firestore_service))[0]
+
+    if result['status'] == 'not_owned':
         raise HTTPException(status_code=404, detail=f"Card with path {card_path} not found")
-    
-    user_card = firestore_service.query_sub_collection(
-        "collections",
-        email,
-        "cards",
-        filters=[
-            ('card_ref', '==', card_ref)
-        ]
+    if result['status'] == 'insufficient':
+        raise HTTPException(status_code=400, detail="Cannot remove more cards than available")
+
+    return True
+
+
+async def get_owned_counts(card_refs: list, email: str, firestore_service: AsyncFirestoreService) -> Dict[str, int]:
+    """
+    Get how many copies of each given card the user owns.
+
+    Collection entries have deterministic IDs, so they are read with get_all
+    in batches of OWNERSHIP_BATCH_SIZE run concurrently: the cost depends on
+    the number of cards asked for, not on the collection size.
+
+    Returns:
+        Dictionary mapping card ref paths to their owned count (missing if not owned)
+    """
+    ids = [collection_card_id(path) for path in {ref.path for ref in card_refs}]
+    if not ids:
+        return {}
+
+    async def fetch_batch(batch_ids):
+        async with ownership_semaphore:
+            return await firestore_service.get_sub_collection_documents("collections", email, "cards", batch_ids)
+
+    batches = await asyncio.gather(*(
+        fetch_batch(ids[i:i + OWNERSHIP_BATCH_SIZE]) for i in range(0, len(ids), OWNERSHIP_BATCH_SIZE)
+    ))
+
+    return {
+        user_card.get('card_ref').path: user_card.get('count', 0)
+        for user_cards in batches
+        for user_card in user_cards.values()
+        if user_card
+    }
+
+
+async def get_series_owned_counts(series_id: str, card_refs: list, email: str,
+                                  firestore_service: AsyncFirestoreService) -> Dict[str, int]:
+    """
+    Get how many copies of each card of a series the user owns, picking the cheaper plan
+    from the user's series counter:
+    - nothing owned in the series: no read at all,
+    - fewer cards owned than in the series: one query on the series_id of the entries,
+    - otherwise, or without built counters: get_all of every card of the series (get_owned_counts).
+
+    Entries written before series_id was stored are missed by the query. When
+    it finds fewer cards than the counter, get_owned_counts is used instead.
+
+    Returns:
+        Dictionary mapping card ref paths to their owned count (missing if not owned)
+    """
+    if not card_refs:
+        return {}
+
+    built, counter = await asyncio.gather(
+        series_counts_built(email, firestore_service),
+        firestore_service.get_sub_collection_document("collections", email, "series_counts", series_id)
     )
-    
-    if len(user_card):
-        user_card = user_card[0]
-        new_count = user_card.get('count', 0) - 1
-        
-        if new_count > 0:
-            firestore_service.update_sub_collection_document(
-                "collections",
-                email,
-                "cards",
-                user_card.get('_id'),
-                {
-                    'count': new_count
-                }
-            )
-        else:
-            if new_count < 0:
-                raise HTTPException(status_code=400, detail="Cannot remove more cards than available")
-            
-            firestore_service.delete_sub_collection_document(
-                "collections",
-                email,
-                "cards",
-                user_card.get('_id')
-            )
-        
-        return True
-    else:
-        raise HTTPException(status_code=404, detail=f"Card with path {card_path} not found")
+    if not built or counter is None or counter.get('owned', 0) >= len(card_refs):
+        return await get_owned_counts(card_refs, email, firestore_service)
+    if counter.get('owned', 0) <= 0:
+        return {}
+
+    async with ownership_semaphore:
+        user_cards = await firestore_service.query_sub_collection(
+            "collections",
+            email,
+            "cards",
+            filters=[
+                ("series_id", "==", series_id)
+            ]
+        )
+    if len(user_cards) < counter.get('owned', 0):
+        return await get_owned_counts(card_refs, email, firestore_service)
+
+    return {
+        user_card.get('card_ref').path: user_card.get('count', 0)
+        for user_card in user_cards
+    }
+
 
+async def series_counts_built(email: str, firestore_service: AsyncFirestoreService) -> bool:
+    """
+    Whether the series_counts of a collection are complete and can be trusted
+    """
+    collection = await firestore_service.get_document("collections", email)
+    return bool(collection and collection.get(SERIES_COUNTS_BUILT))
 
-def check_if_card_is_owned(card_ref, current_collection: list):
+
+async def get_owned_series_counts(email: str, firestore_service: AsyncFirestoreService) -> Dict[str, int]:
     """
-    Check if a card is owned by user
+    Get the number of distinct cards the user owns in each series, from the
+    series_counts maintained by apply_collection_deltas (backfilled by
+    build_series_counts.py). Collections whose counters are not built yet are
+    counted from their cards.
+
+    Returns:
+        Dictionary mapping series IDs to their owned card count
     """
-    for card in current_collection:
-        if card.get('card_ref') == card_ref:
-            return card.get('count')
-    
-    return 0
+    if await series_counts_built(email, firestore_service):
+        counters = await firestore_service.query_sub_collection("collections", email, "series_counts")
+        return {counter.get('_id'): counter.get('owned', 0) for counter in counters}
 
+    owned = {}
+    for user_card in await firestore_service.query_sub_collection("collections", email, "cards"):
+        card_ref = user_card.get('card_ref')
+        if card_ref and user_card.get('count', 0) > 0:
+            series_id = card_series_id(card_ref.path)
+            owned[series_id] = owned.get(series_id, 0) + 1
+    return owned
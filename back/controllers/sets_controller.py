@@ -1,100 +1,171 @@
+import asyncio
 
+from controllers.collection_controller import (
+    get_owned_counts,
+    get_owned_series_counts,
+    get_series_owned_counts,
+    summary_cache,
+)
+from services.async_firestore import AsyncFirestoreService
+from services.card_index import card_sort_key
+from services.catalog_cache import catalog_cache
 
-from concurrent.futures import ThreadPoolExecutor
-from services.firestore import FirestoreService
 
-
-def get_all_sets(licence: str = None):
+async def get_all_sets(firestore_service: AsyncFirestoreService, licence: str = None):
     """
     Get all Pokemon TCG sets
     """
-    firestore_service = FirestoreService()
     filters = []
     if licence:
         filters.append(
             ("licence", "==", licence)
         )
-    sets = firestore_service.query_documents('series', order_by='date', filters=filters, direction="DESCENDING")
+    sets = await catalog_cache.get_or_load(
+        ("series", licence),
+        lambda: firestore_service.query_documents('series', order_by='date', filters=filters, direction="DESCENDING")
+    )
     return sets
 
-def get_cards_in_set(set_doc_id: str):
+async def get_series_cards(series_id: str, firestore_service: AsyncFirestoreService):
     """
-    Get cards by Firestore doc set id
+    Get the cards of a series, served from the catalog cache when possible
     """
-    firestore_service = FirestoreService()
-    cards = firestore_service.query_sub_collection(
-        collection_name='series',
-        document_id=set_doc_id,
-        sub_collection='cards'
+    return await catalog_cache.get_or_load(
+        ("cards", series_id),
+        lambda: firestore_service.query_sub_collection(
+            collection_name='series',
+            document_id=series_id,
+            sub_collection='cards'
+        )
     )
-    for card in cards:
-        try:
-            card['int_number'] = int(card['card_number'])
-        except KeyError:
-            pass
-    return sorted(cards, key=lambda k: k['int_number'])
-
-def fetch_cards(series_id, user_email):
-    
-    firestore_service = FirestoreService()
+
+async def get_cards_in_set(set_doc_id: str, firestore_service: AsyncFirestoreService):
+    """
+    Get cards by Firestore doc set id
+    """
+    cards = await get_series_cards(set_doc_id, firestore_service)
+    return sorted(cards, key=card_int_number)
+
+async def fetch_cards(series_id, user_email, firestore_service: AsyncFirestoreService):
     
     # Fetch collection cards
-    collection_cards = firestore_service.query_sub_collection(
-        "series",
+    collection_cards = await get_series_cards(series_id, firestore_service)
+    if not collection_cards:
+        return []
+    
+    # Owned count of every card of the series, keyed by card ref path
+    user_card_refs = await get_series_owned_counts(
         series_id,
-        "cards"
+        [c.get('ref') for c in collection_cards],
+        user_email,
+        firestore_service
     )
-    
-    # Extract card references once
-    card_refs = [c.get('ref') for c in collection_cards]
-    
-    # Process in batches of 30 (Firestore limit for 'in' queries)
-    # Use ThreadPoolExecutor for parallel batch processing
-    user_cards = []
-    
-    def fetch_batch(batch):
-        return firestore_service.query_sub_collection(
-            "collections",
-            user_email,
-            "cards",
-            filters=[("card_ref", "in", batch)]
-        )
-    
-    batches = [card_refs[i:i+30] for i in range(0, len(card_refs), 30)]
-    
-    with ThreadPoolExecutor(max_workers=min(10, len(batches))) as executor:
-        batch_results = list(executor.map(fetch_batch, batches))
-    
-    # Flatten results
-    for batch in batch_results:
-        user_cards.extend(batch)
-    
-    # Create a dictionary for O(1) lookup with path as key
-    user_card_refs = {
-        card.get('card_ref').path: card.get('count') for card in user_cards
-    }
-    try:
-        # Pre-compute card numbers as integers to avoid repeated conversion
-        card_numbers = {card.get('ref').path: int(card.get('card_number')) for card in collection_cards}
-    except ValueError:
-        card_numbers = {card.get('ref').path: int(card.get('card_number', '-0').split('-')[1]) for card in collection_cards}
-    
+
     # Process all cards at once with optimized lookup
     result = [
-        {
-            "card_name": card.get('card_name'),
-            "set_id": card.get('set_id'),
-            "card_number": card.get('card_number'),
-            "card_img": card.get('card_img'),
-            "_id": card.get('_id'),
-            "ref": card.get('ref').path,
-            'int_number': card_numbers[card.get('ref').path],
-            'count': user_card_refs.get(card.get('ref').path, 0)
-        }
+        card_result(card, card_int_number(card), user_card_refs.get(card.get('ref').path, 0))
         for card in collection_cards
     ]
     
     # Sort the results
     result.sort(key=lambda k: k['int_number'])
     
-    return result
\ No newline at end of file
+    return result
+
+async def fetch_cards_page(series_id, user_email, firestore_service: AsyncFirestoreService,
+                           limit: int, start_after: str = None):
+    """
+    Get one page of the cards of a series with the user's owned count, ordered
+    by the int_number stored on each card, so only the page cards and their
+    ownership are read.
+
+    Returns:
+        The page cards and the cursor of the next page (None on the last page)
+    """
+    cards, next_cursor = await catalog_cache.get_or_load(
+        ("cards", series_id, "page", start_after, limit),
+        lambda: firestore_service.query_sub_collection_page(
+            'series',
+            series_id,
+            'cards',
+            order_by='int_number',
+            limit=limit,
+            start_after=start_after
+        )
+    )
+
+    owned_counts = await get_owned_counts([c.get('ref') for c in cards], user_email, firestore_service)
+    return [
+        card_result(card, card_int_number(card), owned_counts.get(card.get('ref').path, 0))
+        for card in cards
+    ], next_cursor
+
+
+def card_int_number(card: dict) -> int:
+    """
+    Sort key of a card, stored by the importers. Only computed for cards not backfilled yet.
+    """
+    int_number = card.get('int_number')
+    return int_number if int_number is not None else card_sort_key(card.get('card_number'))
+
+
+def card_result(card: dict, int_number: int, count: int) -> dict:
+    """
+    Card of a series as returned to the front end. removed is set on cards the
+    source no longer has, kept by the importers while a collection holds them.
+    """
+    return {
+        "card_name": card.get('card_name'),
+        "set_id": card.get('set_id'),
+        "card_number": card.get('card_number'),
+        "card_img": card.get('card_img'),
+        "_id": card.get('_id'),
+        "ref": card.get('ref').path,
+        'int_number': int_number,
+        'count': count,
+        'removed': bool(card.get('removed'))
+    }
+
+
+async def get_series_card_count(serie: dict, firestore_service: AsyncFirestoreService) -> int:
+    """
+    Number of cards of a series, stored by the importers or counted with an
+    aggregation query for series imported before
+    """
+    if serie.get('card_count') is not None:
+        return serie.get('card_count')
+    return await catalog_cache.get_or_load(
+        ("cards", serie.get('_id'), "count"),
+        lambda: firestore_service.count_sub_collection('series', serie.get('_id'), 'cards')
+    )
+
+
+async def get_collection_summary(email: str, firestore_service: AsyncFirestoreService, licence: str = None):
+    """
+    Get the completion of every series of a licence for a user: owned and total cards per series
+    """
+    async def load():
+        series, owned = await asyncio.gather(
+            get_all_sets(firestore_service, licence),
+            get_owned_series_counts(email, firestore_service)
+        )
+        totals = await asyncio.gather(*(get_series_card_count(serie, firestore_service) for serie in series))
+
+        summary = [
+            {
+                "series_id": serie.get('_id'),
+                "serie_name": serie.get('serie_name'),
+                "set_id": serie.get('set_id'),
+                "licence": serie.get('licence'),
+                "owned": owned.get(serie.get('_id'), 0),
+                "total": total
+            }
+            for serie, total in zip(series, totals)
+        ]
+        return {
+            "series": summary,
+            "owned": sum(s['owned'] for s in summary),
+            "total": sum(s['total'] for s in summary)
+        }
+
+    return await summary_cache.get_or_load(("summary", email, licence), load)
@@ -1,4 +1,3 @@
-
 from services.firestore import FirestoreService
 
 
@@ -8,23 +7,14 @@ documents = firestore_service.query_documents('series')
 
 for i, document in enumerate(documents):
     print(f"{i + 1}/{len(documents)}: {document.get('serie_name')}")
-    subdocuments = firestore_service.query_sub_collection(
-        'series',
-        document.get('_id'),
-        'cards'
-    )
-    ids = [subdoc.get('_id') for subdoc in subdocuments]
-    
-    firestore_service.batch_delete_sub_collection_documents(
-        'series',
-        document.get('_id'),
-        'cards',
-        ids
-    )
-    print(f"Deleted cards from serie: {document.get('serie_name')}")
-    firestore_service.delete_document(
-        'series',
-        document.get('_id')
-    )
-    print(f"Serie deleted: {document.get('serie_name')}")
-    
\ No newline at end of file
+    cards_ref = firestore_service.get_collection_ref('series').document(document.get('_id')).collection('cards')
+
+    # Cards are listed by reference only, without reading them, and deleted with the serie in one bulk write
+    operations = [('delete', card_ref, None) for card_ref in cards_ref.list_documents()]
+    operations.append(('delete', firestore_service.get_collection_ref('series').document(document.get('_id')), None))
+
+    failures = firestore_service.bulk_write(operations)
+    if failures:
+        print(f"Serie not fully deleted, {len(failures)} writes failed: {document.get('serie_name')}")
+    else:
+        print(f"Serie deleted: {document.get('serie_name')}")
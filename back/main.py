@@ -3,11 +3,28 @@ from dotenv import load_dotenv
 from services.auth import get_current_user_email
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import cards_router, collection_router, sets_router
+from config import FIRESTORE_POOL_SIZE
+from routers import cards_router, catalog_router, collection_router, sets_router
+from services.async_firestore import close_async_firestore_pool, init_async_firestore_pool
+from controllers.cards_controller import scan_jobs
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open shared resources on startup and release them on shutdown
+    """
+    init_async_firestore_pool(FIRESTORE_POOL_SIZE)
+    await scan_jobs.start()
+    yield
+    await scan_jobs.stop()
+    await close_async_firestore_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -41,3 +58,10 @@ app.include_router(
     dependencies=[Depends(get_current_user_email)],
     tags=['Sets']
 )
+
+# Called by the importers, authenticated with a shared token instead of a user
+app.include_router(
+    catalog_router,
+    prefix='/api/catalog',
+    tags=['Catalog']
+)
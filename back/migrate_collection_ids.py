@@ -0,0 +1,66 @@
+
+from services.firestore import FirestoreService
+
+BATCH_SIZE = 500
+
+# Re-key every collections/{email}/cards entry by the deterministic ID derived from
+# its card ref path (see controllers.collection_controller.collection_card_id),
+# merging duplicate entries of the same card by summing their counts, and store
+# the series_id of the card used to query the user's cards of a series.
+firestore_service = FirestoreService()
+
+
+def collection_card_id(card_path: str) -> str:
+    return card_path.strip('/').replace('/', '_')
+
+
+users = list(firestore_service.get_collection_ref('collections').list_documents())
+
+for i, user in enumerate(users):
+    print(f"{i + 1}/{len(users)}: {user.id}")
+    user_cards = firestore_service.query_sub_collection('collections', user.id, 'cards')
+
+    merged = {}
+    # Legacy entries of each merged card, deleted in the same batch as its write
+    stale_ids = {}
+    missing_series_id = False
+    for user_card in user_cards:
+        card_ref = user_card.get('card_ref')
+        if not card_ref:
+            continue
+        doc_id = collection_card_id(card_ref.path)
+        if doc_id not in merged:
+            merged[doc_id] = {
+                'card_ref': card_ref,
+                'series_id': card_ref.path.split('/')[1],
+                'licence': user_card.get('licence'),
+                'count': 0
+            }
+        merged[doc_id]['count'] += user_card.get('count', 0)
+        if user_card.get('_id') != doc_id:
+            stale_ids.setdefault(doc_id, []).append(user_card.get('_id'))
+        elif not user_card.get('series_id'):
+            missing_series_id = True
+
+    if not stale_ids and not missing_series_id:
+        print("Already migrated")
+        continue
+
+    cards_ref = user.collection('cards')
+
+    # The write of a card and the deletes of its legacy entries are committed
+    # together, so a run stopped midway never leaves both to be summed again
+    batch, batch_size = firestore_service.db.batch(), 0
+    for doc_id, data in merged.items():
+        card_stale_ids = stale_ids.get(doc_id, [])
+        if batch_size and batch_size + 1 + len(card_stale_ids) > BATCH_SIZE:
+            batch.commit()
+            batch, batch_size = firestore_service.db.batch(), 0
+        batch.set(cards_ref.document(doc_id), data)
+        for stale_id in card_stale_ids:
+            batch.delete(cards_ref.document(stale_id))
+        batch_size += 1 + len(card_stale_ids)
+    if batch_size:
+        batch.commit()
+
+    print(f"Migrated {len(merged)} cards, removed {sum(map(len, stale_ids.values()))} legacy entries")
@@ -1,3 +1,4 @@
 from .cards import router as cards_router
+from .catalog import router as catalog_router
 from .collection import router as collection_router
 from .sets import router as sets_router
\ No newline at end of file
@@ -1,83 +1,116 @@
-from fastapi import APIRouter, Depends, File, UploadFile
-from controllers.cards_controller import find_card_in_firestore, generate
-from controllers.collection_controller import check_if_card_is_owned
+import asyncio
+import json
+from typing import List
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from controllers.cards_controller import (
+    find_card_in_firestore,
+    generate,
+    generate_stream,
+    read_picture,
+    resolve_scanned_cards,
+    scan_jobs,
+    warm_up_scan,
+)
+from config import SCAN_JOB_MAX_BYTES, SCAN_JOB_MAX_PICTURES
 from services.auth import get_current_user_email
-from services.firestore import FirestoreService
+from services.async_firestore import AsyncFirestoreService, get_async_firestore_service
+from services.image_processing import read_upload
 
 router = APIRouter()
 
 @router.post('/read')
-async def read_cards(image: UploadFile = File(...), email: str = Depends(get_current_user_email)):
+async def read_cards(image: UploadFile = File(...), tiling: bool = False,
+                     email: str = Depends(get_current_user_email),
+                     firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
     """
-    Route to receive a photo to read cards from
+    Route to receive a photo to read cards from.
+    The catalog is warmed up while the model reads the picture, and cards are
+    resolved as soon as its response arrives.
+    With tiling, each card detected in the picture is read by its own model call.
+    Cards whose code is legible are read locally by OCR without calling the model.
     """
-    cards_read = generate(image)
-    firestore_service = FirestoreService()
-    cache_series = {}
-    
-    current_collection = firestore_service.query_documents(
-        "collections",
-        filters=[
-            ("email", "==", email)
-        ]
-    )
-    
-    # Pre-process all cards at once to normalize data
-    for card in cards_read:
+    warm_up = asyncio.create_task(warm_up_scan(firestore_service))
+    cards_read = await generate(image, tiling=tiling, firestore_service=firestore_service)
+    await warm_up
+
+    return {
+        "cards": await resolve_scanned_cards(cards_read, email, firestore_service)
+    }
+
+
+@router.post('/read/stream')
+async def read_cards_stream(image: UploadFile = File(...),
+                            email: str = Depends(get_current_user_email),
+                            firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
+    """
+    Streaming variant of /read, as NDJSON: one line per card, sent as soon as
+    the model has written it and it is resolved with its versions and owned counts.
+    An error happening once the stream has started is sent as a last {"error": ...} line.
+    """
+    data, mime_type = await read_picture(image)
+
+    async def lines():
+        warm_up = asyncio.create_task(warm_up_scan(firestore_service))
         try:
-            # cast to int and back to string to remove any leading zeros
-            card['card_number'] = int(card["card_number"])
-            card['card_number'] = str(card['card_number'])
-        except ValueError:
-            pass
-        card['set_id'] = card.get('set_id', '').upper()
-    
-    # Batch process cards to reduce Firestore calls
-    # Create a lookup dictionary to avoid redundant queries
-    card_lookup = {}
-    for card in cards_read:
-        key = f"{card['set_id']}_{card['card_number']}"
-        if key not in card_lookup:
-            card_lookup[key] = {
-                'card_number': card['card_number'],
-                'set_id': card['set_id'],
-                'licence': card.get('licence')
-            }
-    
-    # Process unique cards and update cache
-    for key, card_info in card_lookup.items():
-        cards_data, cache_series = find_card_in_firestore(
-            card_number=card_info['card_number'], 
-            set_id=card_info['set_id'],
-            firestore_service=firestore_service,
-            cache_series=cache_series
-        )
-        card_lookup[key]['card_versions'] = cards_data
-    
-    # Apply results back to original cards
-    for card in cards_read:
-        key = f"{card['set_id']}_{card['card_number']}"
-        card_data = card_lookup[key]['card_versions']
-        card['card_versions'] = [
-            {
-                **c, 
-                'ref': c.get('ref').path, 
-                'licence': card.get('licence'),
-                'count': check_if_card_is_owned(c.get('ref'), current_collection)
-            } for c in card_data
-        ]
-            
+            async for card in generate_stream(data, mime_type):
+                await warm_up
+                resolved = await resolve_scanned_cards([card], email, firestore_service)
+                yield json.dumps(resolved[0]) + "\n"
+        except HTTPException as e:
+            yield json.dumps({"error": e.detail}) + "\n"
+        finally:
+            await warm_up
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post('/read/batch', status_code=202)
+async def read_cards_batch(images: List[UploadFile] = File(...), tiling: bool = False,
+                           email: str = Depends(get_current_user_email)):
+    """
+    Route to queue many photos to read cards from, processed in the background.
+    Returns the job id to poll with GET /read/batch/{job_id}.
+    """
+    if len(images) > SCAN_JOB_MAX_PICTURES:
+        raise HTTPException(status_code=413, detail=f"At most {SCAN_JOB_MAX_PICTURES} pictures per batch")
+
+    # Pictures are preprocessed by the workers, the request only reads them
+    pictures = []
+    size = 0
+    for image in images:
+        data = await read_upload(image)
+        size += len(data)
+        if size > SCAN_JOB_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Pictures of the batch are too large")
+        pictures.append((data, image.content_type))
+    job_id = await scan_jobs.submit(email, tiling, pictures)
     return {
-        "cards": cards_read
+        "job_id": job_id,
+        "status": "pending",
+        "count": len(pictures)
     }
 
-    
+
+@router.get('/read/batch/{job_id}')
+async def get_read_cards_batch(job_id: str, email: str = Depends(get_current_user_email)):
+    """
+    Get the status of a batch scan job and the cards of every picture processed so far
+    """
+    job = await scan_jobs.get(job_id)
+    if job is None or job.pop('email') != email:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @router.get('')
-async def get_card(card_number: str, set_id: str):
+async def get_card(card_number: str, set_id: str,
+                   firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
     """
     Get a card by its set id and card number
     """
-    res, _ = find_card_in_firestore(card_number=card_number, set_id=set_id)
+    res, _ = await find_card_in_firestore(card_number=card_number, set_id=set_id,
+                                          firestore_service=firestore_service)
     if 'ref' in res:
         del res['ref']
     return {
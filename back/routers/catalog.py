@@ -0,0 +1,36 @@
+import hmac
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+
+from config import CATALOG_INVALIDATION_TOKEN
+from services.catalog_cache import card_index_cache, catalog_cache
+
+router = APIRouter()
+
+@router.post('/invalidate')
+async def invalidate_catalog(licence: Optional[str] = None, x_catalog_token: Optional[str] = Header(None)):
+    """
+    Route called by the importers after they write, to drop stale catalog entries.
+
+    The catalog cache lives in the memory of each instance: only the instance
+    receiving this call is invalidated, the other Cloud Run instances keep
+    serving their entries until CATALOG_CACHE_TTL_SECONDS expires.
+    """
+    if not CATALOG_INVALIDATION_TOKEN or not hmac.compare_digest(
+            (x_catalog_token or '').encode(), CATALOG_INVALIDATION_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid catalog token"
+        )
+
+    if licence:
+        # The unfiltered series list contains every licence
+        dropped = catalog_cache.invalidate("series", licence) + catalog_cache.invalidate("series", None)
+    else:
+        dropped = catalog_cache.invalidate("series")
+    dropped += catalog_cache.invalidate("cards")
+    dropped += card_index_cache.invalidate("index")
+
+    return {
+        "invalidated": dropped
+    }
@@ -1,23 +1,37 @@
 from fastapi import APIRouter, Depends, Body
 from controllers.collection_controller import update_cards_in_collection, delete_card_from_collection
+from controllers.sets_controller import get_collection_summary
 from services.auth import get_current_user_email
+from services.async_firestore import AsyncFirestoreService, get_async_firestore_service
 
 router = APIRouter()
 
+@router.get('/summary')
+async def summary(licence: str = None, email: str = Depends(get_current_user_email),
+                  firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
+    """
+    Route to get the owned and total cards of every series, for the sets overview
+    """
+    return await get_collection_summary(email, firestore_service, licence)
+
 @router.patch('')
-async def update_collection(body: dict = Body(...), email: str = Depends(get_current_user_email)):
+async def update_collection(body: dict = Body(...), email: str = Depends(get_current_user_email),
+                            firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
     """
-    Route to update a document in a collection
+    Route to add or remove many cards of the collection at once.
+    Body: {"cards": [{"ref": card path, "licence": ..., "delta": copies to add (negative to remove, 1 by default)}]}
+    Returns the new count and status of every card.
     """
     return {
-        "response": update_cards_in_collection(body.get('cards'), email)
+        "response": await update_cards_in_collection(body.get('cards'), email, firestore_service)
     }
     
 @router.delete('')
-async def delete(card_ref: str, email: str = Depends(get_current_user_email)):
+async def delete(card_ref: str, email: str = Depends(get_current_user_email),
+                 firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
     """
     Route to remove a card from the collection
     """
     return {
-        "response": delete_card_from_collection(card_ref, email)
+        "response": await delete_card_from_collection(card_ref, email, firestore_service)
     }
\ No newline at end of file
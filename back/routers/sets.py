@@ -1,19 +1,36 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 
-from fastapi import APIRouter
-from controllers.sets_controller import get_all_sets, fetch_cards
+from controllers.sets_controller import get_all_sets, fetch_cards, fetch_cards_page
 from services.auth import get_current_user_email
+from services.async_firestore import AsyncFirestoreService, get_async_firestore_service
 
 router = APIRouter()
 
 @router.get('')
-async def get_sets(licence: str = None):
+async def get_sets(licence: str = None, firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
     return {
-        "series": get_all_sets(licence)
+        "series": await get_all_sets(firestore_service, licence)
     }
 
 @router.get('/{serie_doc_id}/cards')
-async def get_cards(serie_doc_id: str, email: str = Depends(get_current_user_email)):
+async def get_cards(serie_doc_id: str, limit: int = Query(None, ge=1, le=500), start_after: str = None,
+                    email: str = Depends(get_current_user_email),
+                    firestore_service: AsyncFirestoreService = Depends(get_async_firestore_service)):
+    """
+    Get the cards of a series with the user's owned count.
+    With a limit, cards are paginated: pass the returned "next" cursor as
+    start_after to get the following page, it is null on the last page.
+    """
+    if limit is None:
+        return {
+            "cards": await fetch_cards(serie_doc_id, email, firestore_service)
+        }
+
+    try:
+        cards, next_cursor = await fetch_cards_page(serie_doc_id, email, firestore_service, limit, start_after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {
-        "cards": fetch_cards(serie_doc_id, email) 
-    }
\ No newline at end of file
+        "cards": cards,
+        "next": next_cursor
+    }
@@ -0,0 +1,540 @@
+from typing import Dict, List, Any, Optional, Tuple
+from google.cloud import firestore
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.firestore import DATABASE_NAME, FirestoreClientPool
+
+# Maximum number of values of a Firestore 'in' filter
+IN_QUERY_LIMIT = 30
+
+_async_pool: Optional[FirestoreClientPool] = None
+
+
+def init_async_firestore_pool(size: int = 1) -> FirestoreClientPool:
+    """
+    Open the process-wide async client pool. Called once on application startup,
+    from inside the event loop the clients will be used on.
+    """
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = FirestoreClientPool(size, client_class=firestore.AsyncClient)
+    _async_pool.open()
+    return _async_pool
+
+
+async def close_async_firestore_pool():
+    """
+    Close the process-wide async client pool. Called once on application shutdown.
+    """
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+def get_async_firestore_service() -> "AsyncFirestoreService":
+    """
+    Dependency returning an AsyncFirestoreService bound to a pooled client.
+    """
+    pool = _async_pool or init_async_firestore_pool()
+    return AsyncFirestoreService(db=pool.acquire())
+
+
+class AsyncFirestoreService:
+    """
+    Non-blocking counterpart of FirestoreService, built on firestore.AsyncClient.
+    Exposes the same methods as coroutines so routes never stall the event loop.
+    """
+
+    def __init__(self, db: Optional[firestore.AsyncClient] = None):
+        """Initialize async Firestore client, reusing the given one if provided."""
+        self.db = db or firestore.AsyncClient(
+            database=DATABASE_NAME
+        )
+
+    async def batch_query_documents(self, collection_name: str, filter_groups: List[List[tuple]],
+                                    order_by: str = None, direction: str = "ASCENDING", limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Execute multiple queries with different filter conditions and combine the results.
+        This allows for implementing "OR" logic across different filter groups.
+
+        Args:
+            collection_name: Name of the collection to query
+            filter_groups: List of filter groups, where each group is a list of filter tuples (field, operator, value)
+            order_by: Field to order results by (applied after combining results)
+            direction: Direction to order results ("ASCENDING" or "DESCENDING")
+            limit: Maximum number of results in the final combined result
+
+        Returns:
+            List of document dictionaries matching any of the filter groups
+        """
+        all_results = []
+        seen_ids = set()
+
+        for filters in filter_groups:
+            query = self.db.collection(collection_name)
+
+            if filters:
+                for field, op, value in filters:
+                    query = query.where(filter=FieldFilter(field, op, value))
+
+            async for doc in query.stream():
+                if doc.id not in seen_ids:
+                    all_results.append({**doc.to_dict(), '_id': doc.id, 'ref': doc.reference})
+                    seen_ids.add(doc.id)
+
+        if order_by and all_results:
+            reverse = direction.upper() == "DESCENDING"
+            all_results.sort(key=lambda x: x.get(order_by, ''), reverse=reverse)
+
+        if limit is not None and limit < len(all_results):
+            all_results = all_results[:limit]
+
+        return all_results
+
+    # Document operations
+    async def get_document(self, collection_name: str, document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a document by ID.
+
+        Args:
+            collection_name: Name of the collection
+            document_id: ID of the document
+
+        Returns:
+            Document data as dictionary or None if not found
+        """
+        doc = await self.db.collection(collection_name).document(document_id).get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+
+    async def get_documents(self, collection_name: str, document_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Retrieve several documents by ID in a single round trip.
+
+        Args:
+            collection_name: Name of the collection
+            document_ids: IDs of the documents
+
+        Returns:
+            Dictionary mapping each ID to its document data, or None if not found
+        """
+        if not document_ids:
+            return {}
+
+        collection_ref = self.db.collection(collection_name)
+        refs = [collection_ref.document(document_id) for document_id in set(document_ids)]
+        documents = {}
+        async for doc in self.db.get_all(refs):
+            documents[doc.id] = doc.to_dict() if doc.exists else None
+        return documents
+
+    async def create_document(self, collection_name: str, data: Dict[str, Any], document_id: Optional[str] = None) -> str:
+        """
+        Create a new document.
+
+        Args:
+            collection_name: Name of the collection
+            data: Document data
+            document_id: Optional ID for the document (auto-generated if not provided)
+
+        Returns:
+            ID of the created document
+        """
+        collection_ref = self.db.collection(collection_name)
+        if document_id:
+            await collection_ref.document(document_id).set(data)
+            return document_id
+        else:
+            _, doc_ref = await collection_ref.add(data)
+            return doc_ref.id
+
+    async def update_document(self, collection_name: str, document_id: str, data: Dict[str, Any]) -> bool:
+        """
+        Update an existing document.
+
+        Args:
+            collection_name: Name of the collection
+            document_id: ID of the document
+            data: Updated data
+
+        Returns:
+            True if update was successful
+        """
+        await self.db.collection(collection_name).document(document_id).update(data)
+        return True
+
+    async def delete_document(self, collection_name: str, document_id: str) -> bool:
+        """
+        Delete a document.
+
+        Args:
+            collection_name: Name of the collection
+            document_id: ID of the document
+
+        Returns:
+            True if deletion was successful
+        """
+        await self.db.collection(collection_name).document(document_id).delete()
+        return True
+
+    async def query_documents(self, collection_name: str, filters: List[tuple] = None,
+                              order_by: str = None, direction: str = "ASCENDING", limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Query documents with filters.
+
+        Args:
+            collection_name: Name of the collection
+            filters: List of filter tuples (field, operator, value)
+            order_by: Field to order results by
+            direction: Direction to order results ("ASCENDING" or "DESCENDING")
+            limit: Maximum number of results
+
+        Returns:
+            List of document dictionaries
+        """
+        query = self.db.collection(collection_name)
+
+        if filters:
+            for field, op, value in filters:
+                query = query.where(filter=FieldFilter(field, op, value))
+
+        if order_by:
+            if direction.upper() == "DESCENDING":
+                query = query.order_by(
+                    order_by, direction=firestore.Query.DESCENDING)
+            else:
+                query = query.order_by(
+                    order_by, direction=firestore.Query.ASCENDING)
+
+        if limit:
+            query = query.limit(limit)
+
+        return [{**doc.to_dict(), '_id': doc.id} async for doc in query.stream()]
+
+    # Sub-collection operations
+    async def get_sub_collection_document(self, collection_name: str, document_id: str,
+                                          sub_collection: str, sub_document_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a document from a sub-collection.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            sub_document_id: ID of the document in the sub-collection
+
+        Returns:
+            Document data or None if not found
+        """
+        doc = await self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection).document(sub_document_id).get()
+        if doc.exists:
+            return doc.to_dict()
+        return None
+
+    async def get_sub_collection_documents(self, collection_name: str, document_id: str,
+                                           sub_collection: str, sub_document_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Get several documents of a sub-collection by ID in a single round trip.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            sub_document_ids: IDs of the documents in the sub-collection
+
+        Returns:
+            Dictionary mapping each ID to its document data, or None if not found
+        """
+        if not sub_document_ids:
+            return {}
+
+        sub_collection_ref = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+        refs = [sub_collection_ref.document(sub_doc_id) for sub_doc_id in set(sub_document_ids)]
+        documents = {}
+        async for doc in self.db.get_all(refs):
+            documents[doc.id] = doc.to_dict() if doc.exists else None
+        return documents
+
+    async def create_sub_collection_document(self, collection_name: str, document_id: str,
+                                             sub_collection: str, data: Dict[str, Any],
+                                             sub_document_id: Optional[str] = None) -> str:
+        """
+        Create a document in a sub-collection.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            data: Document data
+            sub_document_id: Optional ID for the sub-collection document
+
+        Returns:
+            ID of the created document
+        """
+        sub_collection_ref = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+
+        if sub_document_id:
+            await sub_collection_ref.document(sub_document_id).set(data)
+            return sub_document_id
+        else:
+            _, doc_ref = await sub_collection_ref.add(data)
+            return doc_ref.id
+
+    async def batch_delete_sub_collection_documents(self, collection_name: str, document_id: str,
+                                                    sub_collection: str, sub_document_ids: List[str]) -> bool:
+        """
+        Delete multiple documents from a sub-collection using a batch operation.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            sub_document_ids: List of document IDs to delete from the sub-collection
+
+        Returns:
+            True if batch deletion was successful
+        """
+        if not sub_document_ids:
+            return True  # Nothing to delete
+
+        batch = self.db.batch()
+        sub_collection_ref = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+
+        for sub_doc_id in sub_document_ids:
+            batch.delete(sub_collection_ref.document(sub_doc_id))
+
+        await batch.commit()
+
+        return True
+
+    async def batch_create_sub_collection_documents(self, collection_name: str, document_id: str,
+                                                    sub_collection: str, documents_data: List[Dict[str, Any]],
+                                                    document_ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Create multiple documents in a sub-collection using a batch operation.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            documents_data: List of document data dictionaries
+            document_ids: Optional list of IDs for the sub-collection documents
+                         (must match length of documents_data if provided)
+
+        Returns:
+            List of IDs of the created documents
+        """
+        batch = self.db.batch()
+        sub_collection_ref = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+        created_ids = []
+
+        if document_ids and len(document_ids) != len(documents_data):
+            raise ValueError(
+                "Length of document_ids must match length of documents_data")
+
+        for i, data in enumerate(documents_data):
+            if document_ids:
+                doc_ref = sub_collection_ref.document(document_ids[i])
+            else:
+                doc_ref = sub_collection_ref.document()
+            created_ids.append(doc_ref.id)
+            batch.set(doc_ref, data)
+
+        await batch.commit()
+
+        return created_ids
+
+    async def batch_set_sub_collection_documents(self, collection_name: str, document_id: str,
+                                                 sub_collection: str, documents_data: Dict[str, Dict[str, Any]],
+                                                 merge: bool = True) -> List[str]:
+        """
+        Create or update multiple documents of a sub-collection in a single batch commit.
+        Data may contain transforms such as firestore.Increment.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            documents_data: Dictionary mapping sub-collection document IDs to their data
+            merge: Merge data into existing documents instead of overwriting them
+
+        Returns:
+            List of IDs of the written documents
+        """
+        if not documents_data:
+            return []
+
+        batch = self.db.batch()
+        sub_collection_ref = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+
+        for sub_doc_id, data in documents_data.items():
+            batch.set(sub_collection_ref.document(sub_doc_id), data, merge=merge)
+
+        await batch.commit()
+
+        return list(documents_data)
+
+    async def update_sub_collection_document(self, collection_name: str, document_id: str,
+                                             sub_collection: str, sub_document_id: str,
+                                             data: Dict[str, Any]) -> bool:
+        """
+        Update a document in a sub-collection.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            sub_document_id: ID of the document in the sub-collection
+            data: Updated data
+
+        Returns:
+            True if update was successful
+        """
+        await self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection).document(sub_document_id).update(data)
+        return True
+
+    async def delete_sub_collection_document(self, collection_name: str, document_id: str,
+                                             sub_collection: str, sub_document_id: str) -> bool:
+        """
+        Delete a document from a sub-collection.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            sub_document_id: ID of the document in the sub-collection
+
+        Returns:
+            True if deletion was successful
+        """
+        await self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection).document(sub_document_id).delete()
+        return True
+
+    async def query_sub_collection(self, collection_name: str, document_id: str,
+                                   sub_collection: str, filters: List[tuple] = None,
+                                   order_by: str = None, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Query documents in a sub-collection.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            filters: List of filter tuples (field, operator, value)
+            order_by: Field to order results by
+            limit: Maximum number of results
+
+        Returns:
+            List of document dictionaries
+        """
+        query = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+
+        if filters:
+            for field, op, value in filters:
+                query = query.where(filter=FieldFilter(field, op, value))
+
+        if order_by:
+            query = query.order_by(order_by)
+
+        if limit:
+            query = query.limit(limit)
+
+        return [{**doc.to_dict(), '_id': doc.id, 'ref': doc.reference} async for doc in query.stream()]
+
+    async def query_sub_collection_page(self, collection_name: str, document_id: str,
+                                        sub_collection: str, order_by: str, limit: int,
+                                        start_after: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Read one page of a sub-collection ordered by a field, Firestore side.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            order_by: Field to order results by (documents without it are skipped)
+            limit: Maximum number of results
+            start_after: ID of the last document of the previous page
+
+        Returns:
+            The page documents, and the cursor of the next page (None on the last page)
+        """
+        collection = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+        query = collection.order_by(order_by).limit(limit)
+
+        if start_after:
+            cursor = await collection.document(start_after).get()
+            if not cursor.exists:
+                raise ValueError(f"Unknown cursor: {start_after}")
+            query = query.start_after(cursor)
+
+        documents = [{**doc.to_dict(), '_id': doc.id, 'ref': doc.reference} async for doc in query.stream()]
+        next_cursor = documents[-1]['_id'] if len(documents) == limit else None
+        return documents, next_cursor
+
+    async def count_sub_collection(self, collection_name: str, document_id: str,
+                                   sub_collection: str, filters: List[tuple] = None) -> int:
+        """
+        Count the documents of a sub-collection with an aggregation query, without reading them.
+
+        Args:
+            collection_name: Name of the parent collection
+            document_id: ID of the parent document
+            sub_collection: Name of the sub-collection
+            filters: List of filter tuples (field, operator, value)
+
+        Returns:
+            Number of matching documents
+        """
+        query = self.db.collection(collection_name).document(document_id)\
+            .collection(sub_collection)
+
+        if filters:
+            for field, op, value in filters:
+                query = query.where(filter=FieldFilter(field, op, value))
+
+        results = await query.count(alias="count").get()
+        return results[0][0].value
+
+    def get_collection_ref(self, collection_name: str):
+        """
+        Get Firestore ref of Firestore collection
+
+        Args:
+            collection_name: Name of the collection
+
+        Returns:
+            Firestore reference to the collection
+        """
+        return self.db.collection(collection_name)
+
+    async def get_document_ref_by_path(self, ref_path: str):
+        """
+        Retrieve a document reference by its path, checking that the document exists.
+
+        Args:
+            ref_path: Full path to the document, e.g. "series/IaSmT9uI8EJseYJDAtPB/cards/Qf93tBIlH4kzSp5QlAkW"
+
+        Returns:
+            Document reference or None if not found
+        """
+        path_components = ref_path.split('/')
+
+        if len(path_components) < 2 or len(path_components) % 2 != 0:
+            raise ValueError(f"Invalid reference path: {ref_path}. Path must have even number of segments.")
+
+        doc = await self.db.document(ref_path).get()
+        if doc.exists:
+            return doc.reference
+        return None
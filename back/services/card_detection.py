@@ -0,0 +1,118 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from config import TILING_JPEG_QUALITY, TILING_MIN_CARD_AREA
+
+# Width / height of a standard TCG card (63 x 88 mm)
+CARD_RATIO = 63 / 88
+RATIO_TOLERANCE = 0.2
+# Part of a photo covered by its card for the photo to be taken as a single card
+SINGLE_CARD_MIN_AREA = 0.25
+
+Region = Tuple[int, int, int, int]
+
+
+def detect_card_regions(data: bytes) -> List[Region]:
+    """
+    Detect card rectangles in a picture from its edges, on CPU only.
+
+    Outer contours of the edge map are kept when their bounding box has the
+    proportions of a card (in portrait or landscape) and covers at least
+    TILING_MIN_CARD_AREA of the picture. Boxes nested in another one (card art,
+    text boxes) are dropped.
+
+    Returns:
+        (x, y, width, height) boxes in reading order (top to bottom, left to right)
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return []
+
+    height, width = image.shape
+    blurred = cv2.GaussianBlur(image, (5, 5), 0)
+    edges = cv2.Canny(blurred, 50, 150)
+    # Close small gaps of the card borders so each card gives one contour
+    edges = cv2.dilate(edges, np.ones((5, 5), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    regions = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w * h < TILING_MIN_CARD_AREA * width * height or w * h > 0.95 * width * height:
+            continue
+        ratio = min(w, h) / max(w, h)
+        if abs(ratio - CARD_RATIO) > RATIO_TOLERANCE:
+            continue
+        regions.append((x, y, w, h))
+
+    regions = [
+        region for region in regions
+        if not any(other != region and _contains(other, region) for other in regions)
+    ]
+
+    # Group boxes into rows by their vertical center, then sort each row left to right
+    regions.sort(key=lambda r: r[1] + r[3] / 2)
+    rows = []
+    for region in regions:
+        if rows and region[1] + region[3] / 2 < rows[-1][0][1] + rows[-1][0][3]:
+            rows[-1].append(region)
+        else:
+            rows.append([region])
+    return [region for row in rows for region in sorted(row, key=lambda r: r[0])]
+
+
+def crop_regions(data: bytes, regions: List[Region], padding: float = 0.03) -> List[bytes]:
+    """
+    Crop each region out of a picture, with a small margin, as JPEG bytes
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+
+    crops = []
+    for x, y, w, h in regions:
+        pad_x, pad_y = int(w * padding), int(h * padding)
+        crop = image[max(0, y - pad_y):min(height, y + h + pad_y), max(0, x - pad_x):min(width, x + w + pad_x)]
+        _, encoded = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, TILING_JPEG_QUALITY])
+        crops.append(encoded.tobytes())
+    return crops
+
+
+def single_card_picture(data: bytes, regions: Optional[List[Region]] = None) -> Optional[bytes]:
+    """
+    Picture of the only card of a photo, for local OCR: the crop of its single
+    detected card when it covers at least SINGLE_CARD_MIN_AREA of the photo, or
+    the whole photo when no card is detected but it has the proportions of a
+    card (framed on one card). None when the photo may hold several cards.
+    regions are the ones of detect_card_regions, when already detected.
+    """
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        return None
+    height, width = image.shape
+
+    if regions is None:
+        regions = detect_card_regions(data)
+    if not regions:
+        ratio = min(width, height) / max(width, height)
+        return data if abs(ratio - CARD_RATIO) <= RATIO_TOLERANCE else None
+    if len(regions) > 1:
+        return None
+
+    # Regions are in full resolution pixels, the reduced image is 4 times smaller
+    _, _, w, h = regions[0]
+    if w * h < SINGLE_CARD_MIN_AREA * width * height * 16:
+        return None
+    return crop_regions(data, regions)[0]
+
+
+def _contains(outer: Region, inner: Region) -> bool:
+    """
+    Check if a box is inside another one
+    """
+    return (
+        outer[0] <= inner[0] and outer[1] <= inner[1]
+        and outer[0] + outer[2] >= inner[0] + inner[2]
+        and outer[1] + outer[3] >= inner[1] + inner[3]
+    )
@@ -0,0 +1,105 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from services.async_firestore import AsyncFirestoreService
+from services.catalog_cache import card_index_cache
+
+CARD_INDEX_COLLECTION = "card_index"
+LICENCES = ("pokemon", "one piece")
+
+
+def normalize_licence(licence: Optional[str]) -> Optional[str]:
+    """
+    Normalize a licence name, returning None when it is not a known licence
+    """
+    licence = (licence or '').strip().lower()
+    return licence if licence in LICENCES else None
+
+
+def normalize_set_id(set_id: Optional[str]) -> str:
+    """
+    Normalize a set id (uppercase, no surrounding spaces)
+    """
+    return (set_id or '').strip().upper()
+
+
+def normalize_card_number(card_number) -> str:
+    """
+    Normalize a card number, dropping leading zeros of purely numeric ones
+    (e.g. "078" -> "78", "op08-001" -> "OP08-001")
+    """
+    card_number = str(card_number or '').strip().upper()
+    try:
+        return str(int(card_number))
+    except ValueError:
+        return card_number
+
+
+def card_sort_key(card_number) -> int:
+    """
+    Numeric sort key of a card number, its last group of digits
+    (e.g. "078" -> 78, "OP08-001" -> 1, "TG05" -> 5). 0 when it has no digits.
+    Sort key stored as int_number on card documents by the importers.
+    """
+    digits = re.findall(r'\d+', str(card_number or ''))
+    return int(digits[-1]) if digits else 0
+
+
+def card_index_id(licence: str, set_id: str, card_number) -> str:
+    """
+    Build the card_index document ID of a normalized (licence, set_id, card_number) key
+    """
+    return "|".join([
+        normalize_licence(licence) or '',
+        normalize_set_id(set_id),
+        normalize_card_number(card_number)
+    ]).replace('/', '-')
+
+
+def card_index_ids(licence: Optional[str], set_id: str, card_number) -> List[str]:
+    """
+    Candidate card_index IDs of a card. When the licence is unknown, every licence is tried.
+    """
+    licence = normalize_licence(licence)
+    licences = [licence] if licence else LICENCES
+    return [card_index_id(l, set_id, card_number) for l in licences]
+
+
+async def lookup_card_index(keys: List[Tuple[Optional[str], str, str]],
+                            firestore_service: AsyncFirestoreService) -> Dict[Tuple[Optional[str], str, str], Optional[List[dict]]]:
+    """
+    Resolve many (licence, set_id, card_number) keys against the card index in one batched read.
+
+    Returns:
+        Dictionary mapping each key to the list of its card versions, or None if it is not indexed
+    """
+    candidates = {key: card_index_ids(*key) for key in keys}
+
+    entries = {}
+    missing = []
+    for ids in candidates.values():
+        for doc_id in ids:
+            if doc_id in entries or doc_id in missing:
+                continue
+            cached = card_index_cache.get(("index", doc_id))
+            if cached is not None:
+                entries[doc_id] = cached
+            else:
+                missing.append(doc_id)
+
+    if missing:
+        documents = await firestore_service.get_documents(CARD_INDEX_COLLECTION, missing)
+        for doc_id, document in documents.items():
+            if document is None:
+                continue
+            versions = [
+                {**version, 'ref': firestore_service.db.document(version.get('ref'))}
+                for version in document.get('versions', [])
+            ]
+            card_index_cache.set(("index", doc_id), versions)
+            entries[doc_id] = versions
+
+    results = {}
+    for key, ids in candidates.items():
+        results[key] = next((entries[doc_id] for doc_id in ids if entries.get(doc_id)), None)
+    return results
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from config import CARD_INDEX_CACHE_MAX_ENTRIES, CATALOG_CACHE_MAX_ENTRIES, CATALOG_CACHE_TTL_SECONDS
+
+
+class CatalogCache:
+    """
+    In-memory cache for catalog data (series lists, series cards).
+
+    The catalog only changes when the importers run, so entries live for a TTL
+    and the least recently used ones are evicted once the cache is full.
+    Importers call the invalidation endpoint after writing to drop stale entries.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loading = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Return the cached value for key, or None if missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """
+        Store a value, evicting the least recently used entries if needed
+        """
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached value for key, calling loader on a miss.
+        Concurrent misses on the same key share a single load.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        if key in self._loading:
+            return await self._loading[key]
+
+        future = asyncio.ensure_future(loader())
+        self._loading[key] = future
+        try:
+            value = await future
+        finally:
+            self._loading.pop(key, None)
+
+        self.set(key, value)
+        return value
+
+    def invalidate(self, *prefix: Hashable) -> int:
+        """
+        Drop every entry whose key starts with prefix (all entries if no prefix).
+
+        Returns:
+            Number of entries dropped
+        """
+        keys = [
+            key for key in self._entries
+            if key[:len(prefix)] == prefix
+        ]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+
+catalog_cache = CatalogCache(
+    max_entries=CATALOG_CACHE_MAX_ENTRIES,
+    ttl=CATALOG_CACHE_TTL_SECONDS
+)
+
+# Card index entries, keyed by ("index", card_index document id)
+card_index_cache = CatalogCache(
+    max_entries=CARD_INDEX_CACHE_MAX_ENTRIES,
+    ttl=CATALOG_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,99 @@
+import io
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import IMAGE_JPEG_QUALITY, IMAGE_MAX_LONG_EDGE, UPLOAD_CHUNK_SIZE, UPLOAD_MAX_BYTES
+
+# HEIC/HEIF decoding is optional: without pillow-heif those pictures are sent as is
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    HEIF_SUPPORT = True
+except ImportError:
+    HEIF_SUPPORT = False
+
+EXIF_ORIENTATION = 0x0112
+
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'heic': 'image/heic',
+    'heif': 'image/heif',
+}
+
+
+async def read_upload(image: UploadFile) -> bytes:
+    """
+    Read an upload chunk by chunk, rejecting it as soon as it exceeds UPLOAD_MAX_BYTES
+    """
+    data = bytearray()
+    while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+        data.extend(chunk)
+        if len(data) > UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Picture is too large")
+    return bytes(data)
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """
+    Detect the real format of a picture from its magic bytes, whatever its declared content type
+    """
+    if data[:3] == b'\xff\xd8\xff':
+        return 'jpeg'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[4:8] == b'ftyp':
+        brand = data[8:12]
+        if brand in (b'heic', b'heix', b'heim', b'heis'):
+            return 'heic'
+        if brand in (b'mif1', b'msf1', b'heif'):
+            return 'heif'
+    return None
+
+
+def preprocess_image(data: bytes) -> Tuple[bytes, str]:
+    """
+    Normalize a picture before sending it to the model: apply the EXIF rotation,
+    downscale it to IMAGE_MAX_LONG_EDGE pixels and recompress it as JPEG.
+
+    Pictures of an unknown format are rejected with a 415 and pictures whose
+    dimensions exceed the Pillow decompression bomb limit with a 413. Pictures
+    of a known format that cannot be decoded are returned untouched with their
+    sniffed mime type.
+
+    Returns:
+        The picture bytes and their mime type
+    """
+    image_format = sniff_format(data)
+    if image_format is None:
+        raise HTTPException(status_code=415, detail="Unsupported picture format")
+
+    if image_format in ('heic', 'heif') and not HEIF_SUPPORT:
+        return data, MIME_TYPES[image_format]
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        needs_resize = max(image.size) > IMAGE_MAX_LONG_EDGE
+        needs_rotation = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        # Let the JPEG decoder downscale while decoding
+        image.draft('RGB', (IMAGE_MAX_LONG_EDGE, IMAGE_MAX_LONG_EDGE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((IMAGE_MAX_LONG_EDGE, IMAGE_MAX_LONG_EDGE), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        image.convert('RGB').save(output, format='JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+    except Image.DecompressionBombError:
+        raise HTTPException(status_code=413, detail="Picture dimensions are too large")
+    except (UnidentifiedImageError, OSError):
+        return data, MIME_TYPES[image_format]
+
+    processed = output.getvalue()
+    # Keep an already small upright JPEG rather than a bigger re-encoding of it
+    if image_format == 'jpeg' and not needs_resize and not needs_rotation and len(processed) >= len(data):
+        return data, MIME_TYPES[image_format]
+    return processed, 'image/jpeg'
@@ -0,0 +1,52 @@
+import json
+from typing import List
+
+
+class JsonArrayStreamParser:
+    """
+    Incremental parser of a streamed JSON array of objects.
+
+    Text is fed as it arrives and every top-level object is returned as soon as
+    its closing brace is received, without waiting for the end of the array.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Feed the next part of the text.
+
+        Returns:
+            The objects completed by this part, in order
+        """
+        objects = []
+        for char in text:
+            if self._depth == 0:
+                # Between objects: skip the array brackets, commas and whitespace
+                if char == '{':
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    objects.append(json.loads(''.join(self._buffer)))
+                    self._buffer = []
+        return objects
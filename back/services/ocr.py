@@ -0,0 +1,84 @@
+import io
+import re
+import shutil
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Local OCR is optional: without pytesseract or the tesseract binary every scan goes to the model
+try:
+    import pytesseract
+    OCR_AVAILABLE = shutil.which('tesseract') is not None
+except ImportError:
+    OCR_AVAILABLE = False
+
+# Pokemon: set code then collector number fraction, bottom left (e.g. "SV6 052/101")
+POKEMON_CODE = re.compile(r'\b([A-Z]{1,4}\d{0,3}[A-Z]?)\s+(\d{1,3})\s*/\s*\d{1,3}\b')
+# One piece: full card code, bottom right (e.g. "OP08-001", "ST01-012", "P-001")
+ONE_PIECE_CODE = re.compile(r'\b([A-Z]{1,3}\d{0,2})-(\d{3})\b')
+
+# Part of the card holding the code: (left, top, right, bottom) as fractions of the card
+CODE_REGIONS = {
+    'pokemon': (0.0, 0.88, 0.5, 1.0),
+    'one piece': (0.5, 0.88, 1.0, 1.0),
+}
+
+
+def _read_region(card: Image.Image, region: tuple) -> tuple:
+    """
+    OCR a region of a card, returning its text and the mean confidence of its words
+    """
+    width, height = card.size
+    left, top, right, bottom = region
+    crop = card.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+    # Small printed codes read much better upscaled and contrasted
+    crop = ImageOps.autocontrast(crop.resize((crop.width * 2, crop.height * 2), Image.Resampling.LANCZOS))
+
+    data = pytesseract.image_to_data(crop, config='--psm 6', output_type=pytesseract.Output.DICT)
+    words = [
+        (word, float(conf)) for word, conf in zip(data['text'], data['conf'])
+        if word.strip() and float(conf) >= 0
+    ]
+    if not words:
+        return '', 0.0
+    return ' '.join(word for word, _ in words).upper(), sum(conf for _, conf in words) / len(words)
+
+
+def read_card_code(data: bytes) -> Optional[dict]:
+    """
+    Read the set id and card number printed on a picture of a single card.
+
+    Returns:
+        A card dict (licence, set_id, card_number, card_name, confidence) or None if no code was read
+    """
+    if not OCR_AVAILABLE:
+        return None
+
+    try:
+        card = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert('L')
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    text, confidence = _read_region(card, CODE_REGIONS['one piece'])
+    match = ONE_PIECE_CODE.search(text)
+    if match:
+        return {
+            'licence': 'one piece',
+            'set_id': match.group(1),
+            'card_number': f"{match.group(1)}-{match.group(2)}",
+            'card_name': None,
+            'confidence': confidence
+        }
+
+    text, confidence = _read_region(card, CODE_REGIONS['pokemon'])
+    match = POKEMON_CODE.search(text)
+    if match:
+        return {
+            'licence': 'pokemon',
+            'set_id': match.group(1),
+            'card_number': match.group(2),
+            'card_name': None,
+            'confidence': confidence
+        }
+
+    return None
@@ -0,0 +1,206 @@
+import io
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from config import (
+    SCAN_CACHE_BACKEND,
+    SCAN_CACHE_MAX_DISTANCE,
+    SCAN_CACHE_MAX_ENTRIES,
+    SCAN_CACHE_PATH,
+    SCAN_CACHE_TTL_SECONDS,
+)
+
+HASH_SIZE = 16
+
+
+def dhash(data: bytes, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """
+    Difference hash of a picture: compares adjacent pixels of a small grayscale
+    thumbnail, so re-photographing the same page gives a hash a few bits away.
+
+    Returns:
+        The hash as a hash_size * hash_size bits integer, or None if the picture cannot be decoded
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        # Let the JPEG decoder downscale while decoding instead of decoding every pixel
+        image.draft('L', (hash_size * 8, hash_size * 8))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class MemoryScanCacheBackend:
+    """
+    In-process backend, entries are lost on restart
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: int) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: int, expires_at: float, value: str):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: int):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self) -> Iterator[int]:
+        with self._lock:
+            return iter(list(self._entries))
+
+
+class DiskScanCacheBackend:
+    """
+    Local SQLite backend, entries survive restarts of the process
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL, last_used REAL, value TEXT)"
+        )
+        self._db.commit()
+
+    def get(self, key: int) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM scan_cache WHERE key = ?", (format(key, 'x'),)
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE scan_cache SET last_used = ? WHERE key = ?", (time.time(), format(key, 'x'))
+                )
+                self._db.commit()
+            return row
+
+    def set(self, key: int, expires_at: float, value: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO scan_cache VALUES (?, ?, ?, ?)",
+                (format(key, 'x'), expires_at, time.time(), value)
+            )
+            self._db.execute(
+                "DELETE FROM scan_cache WHERE key NOT IN "
+                "(SELECT key FROM scan_cache ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._db.commit()
+
+    def delete(self, key: int):
+        with self._lock:
+            self._db.execute("DELETE FROM scan_cache WHERE key = ?", (format(key, 'x'),))
+            self._db.commit()
+
+    def keys(self) -> Iterator[int]:
+        with self._lock:
+            rows = self._db.execute("SELECT key FROM scan_cache").fetchall()
+        return (int(row[0], 16) for row in rows)
+
+
+class ScanCache:
+    """
+    Cache of model results keyed by the perceptual hash of the scanned picture.
+
+    A lookup first tries the exact hash, then the closest stored hash within
+    max_distance differing bits, so a slightly different photo of the same
+    page or card still hits. Entries expire after ttl seconds and the least
+    recently used ones are evicted past the backend max_entries.
+    """
+
+    def __init__(self, backend, ttl: float, max_distance: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_distance = max_distance
+
+    def _get(self, key: int) -> Optional[Any]:
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.time():
+            self.backend.delete(key)
+            return None
+        return json.loads(value)
+
+    def lookup(self, data: bytes) -> Tuple[Optional[int], Optional[Any]]:
+        """
+        Hash a picture and look for the cached result of a near-identical one.
+
+        Returns:
+            The picture hash (None if it cannot be decoded) and the cached result (None on a miss)
+        """
+        key = dhash(data)
+        if key is None:
+            return None, None
+
+        cached = self._get(key)
+        if cached is not None:
+            return key, cached
+
+        closest, distance = None, self.max_distance + 1
+        for stored_key in self.backend.keys():
+            stored_distance = (stored_key ^ key).bit_count()
+            if stored_distance < distance:
+                closest, distance = stored_key, stored_distance
+
+        if closest is None:
+            return key, None
+        return key, self._get(closest)
+
+    def store(self, key: Optional[int], result: Any):
+        """
+        Cache the result of a picture hash
+        """
+        if key is None:
+            return
+        self.backend.set(key, time.time() + self.ttl, json.dumps(result))
+
+
+def create_scan_cache() -> Optional[ScanCache]:
+    """
+    Build the scan cache configured by SCAN_CACHE_BACKEND ("memory", "disk" or "none")
+    """
+    if SCAN_CACHE_BACKEND == "memory":
+        backend = MemoryScanCacheBackend(SCAN_CACHE_MAX_ENTRIES)
+    elif SCAN_CACHE_BACKEND == "disk":
+        backend = DiskScanCacheBackend(SCAN_CACHE_PATH, SCAN_CACHE_MAX_ENTRIES)
+    else:
+        return None
+    return ScanCache(backend, ttl=SCAN_CACHE_TTL_SECONDS, max_distance=SCAN_CACHE_MAX_DISTANCE)
+
+
+scan_cache = create_scan_cache()
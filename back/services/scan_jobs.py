@@ -0,0 +1,331 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import (
+    SCAN_JOB_MAX_QUEUED_BYTES,
+    SCAN_JOB_MAX_QUEUED_PER_USER,
+    SCAN_JOB_PATH,
+    SCAN_JOB_STORE,
+    SCAN_JOB_TTL_SECONDS,
+)
+
+# Seconds between two purges of the expired jobs by the workers
+PURGE_INTERVAL_SECONDS = 60
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_status(statuses: List[str]) -> str:
+    """
+    Overall status of a job from the status of its pictures
+    """
+    if all(status == PENDING for status in statuses):
+        return PENDING
+    if any(status in (PENDING, RUNNING) for status in statuses):
+        return RUNNING
+    if all(status == FAILED for status in statuses):
+        return FAILED
+    return DONE
+
+
+class MemoryJobStore:
+    """
+    In-process job store, jobs are lost on restart
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, email: str, tiling: bool, pictures: List[Tuple[bytes, str]]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge()
+            self._jobs[job_id] = {
+                'email': email,
+                'tiling': tiling,
+                'created_at': time.time(),
+                'items': [
+                    {'status': PENDING, 'data': data, 'mime_type': mime_type, 'cards': None, 'error': None}
+                    for data, mime_type in pictures
+                ]
+            }
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                'job_id': job_id,
+                'email': job['email'],
+                'created_at': job['created_at'],
+                'items': [
+                    {'status': item['status'], 'cards': item['cards'], 'error': item['error']}
+                    for item in job['items']
+                ]
+            }
+
+    def get_picture(self, job_id: str, position: int) -> Tuple[str, bool, bytes, str]:
+        with self._lock:
+            job = self._jobs[job_id]
+            item = job['items'][position]
+            return job['email'], job['tiling'], item['data'], item['mime_type']
+
+    def update(self, job_id: str, position: int, status: str, cards: Optional[list] = None,
+               error: Optional[str] = None):
+        with self._lock:
+            item = self._jobs[job_id]['items'][position]
+            item.update(status=status, cards=cards, error=error)
+            if status in (DONE, FAILED):
+                # The picture is not needed anymore once it is processed
+                item['data'] = None
+
+    def pending(self) -> List[Tuple[str, int]]:
+        return []
+
+    def purge(self):
+        with self._lock:
+            self._purge()
+
+    def _purge(self):
+        expired = time.time() - SCAN_JOB_TTL_SECONDS
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job['created_at'] < expired and job_status([item['status'] for item in job['items']]) in (DONE, FAILED)
+        ]:
+            del self._jobs[job_id]
+
+
+class DiskJobStore:
+    """
+    Local SQLite job store: pictures not processed yet are queued again after a restart
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_jobs (job_id TEXT PRIMARY KEY, email TEXT, tiling INTEGER, created_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scan_job_items ("
+            "job_id TEXT, position INTEGER, status TEXT, data BLOB, mime_type TEXT, cards TEXT, error TEXT, "
+            "PRIMARY KEY (job_id, position))"
+        )
+        self._db.commit()
+
+    def create(self, email: str, tiling: bool, pictures: List[Tuple[bytes, str]]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge()
+            self._db.execute("INSERT INTO scan_jobs VALUES (?, ?, ?, ?)", (job_id, email, int(tiling), time.time()))
+            self._db.executemany(
+                "INSERT INTO scan_job_items VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+                [(job_id, position, PENDING, data, mime_type) for position, (data, mime_type) in enumerate(pictures)]
+            )
+            self._db.commit()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._db.execute(
+                "SELECT email, created_at FROM scan_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            items = self._db.execute(
+                "SELECT status, cards, error FROM scan_job_items WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return {
+            'job_id': job_id,
+            'email': job[0],
+            'created_at': job[1],
+            'items': [
+                {'status': status, 'cards': json.loads(cards) if cards else None, 'error': error}
+                for status, cards, error in items
+            ]
+        }
+
+    def get_picture(self, job_id: str, position: int) -> Tuple[str, bool, bytes, str]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT email, tiling, data, mime_type FROM scan_job_items JOIN scan_jobs USING (job_id) "
+                "WHERE job_id = ? AND position = ?",
+                (job_id, position)
+            ).fetchone()
+
+    def update(self, job_id: str, position: int, status: str, cards: Optional[list] = None,
+               error: Optional[str] = None):
+        with self._lock:
+            if status in (DONE, FAILED):
+                # The picture is not needed anymore once it is processed
+                self._db.execute(
+                    "UPDATE scan_job_items SET status = ?, cards = ?, error = ?, data = NULL "
+                    "WHERE job_id = ? AND position = ?",
+                    (status, json.dumps(cards) if cards is not None else None, error, job_id, position)
+                )
+            else:
+                self._db.execute(
+                    "UPDATE scan_job_items SET status = ? WHERE job_id = ? AND position = ?",
+                    (status, job_id, position)
+                )
+            self._db.commit()
+
+    def pending(self) -> List[Tuple[str, int]]:
+        """
+        Pictures left pending or running when the process stopped
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT job_id, position FROM scan_job_items JOIN scan_jobs USING (job_id) "
+                "WHERE status IN (?, ?) ORDER BY created_at, position",
+                (PENDING, RUNNING)
+            ).fetchall()
+
+    def purge(self):
+        with self._lock:
+            self._purge()
+            self._db.commit()
+
+    def _purge(self):
+        # Expired jobs still being processed are kept until they are finished
+        expired = [row[0] for row in self._db.execute(
+            "SELECT job_id FROM scan_jobs WHERE created_at < ? AND job_id NOT IN "
+            "(SELECT job_id FROM scan_job_items WHERE status IN (?, ?))",
+            (time.time() - SCAN_JOB_TTL_SECONDS, PENDING, RUNNING)
+        ).fetchall()]
+        self._db.executemany("DELETE FROM scan_job_items WHERE job_id = ?", [(job_id,) for job_id in expired])
+        self._db.executemany("DELETE FROM scan_jobs WHERE job_id = ?", [(job_id,) for job_id in expired])
+
+
+class ScanJobQueue:
+    """
+    Queue of scan jobs processed in the background by a fixed pool of workers.
+
+    A job holds many pictures, each one is queued on its own so the pictures of
+    a big job are spread over every worker. The process callable receives the
+    uploaded picture bytes, their declared mime type, the user email and the
+    tiling flag, and returns the resolved cards.
+
+    Pictures waiting to be processed are bounded by SCAN_JOB_MAX_QUEUED_BYTES
+    for the process and SCAN_JOB_MAX_QUEUED_PER_USER per user. Expired jobs
+    are purged by the workers every PURGE_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, store, process: Callable[[bytes, str, str, bool], Awaitable[list]], workers: int):
+        self.store = store
+        self.process = process
+        self.workers = workers
+        self._queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        self._tasks = []
+        # (email, size) of each submitted picture not processed yet
+        self._queued: Dict[Tuple[str, int], Tuple[str, int]] = {}
+        self._queued_bytes = 0
+        self._queued_by_user: Dict[str, int] = {}
+        self._last_purge = time.monotonic()
+
+    async def start(self):
+        """
+        Start the workers and queue again the pictures left over by a previous run
+        """
+        for job_id, position in await asyncio.to_thread(self.store.pending):
+            self._queue.put_nowait((job_id, position))
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """
+        Cancel the workers. Pictures being processed stay running and are retried on next start.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, email: str, tiling: bool, pictures: List[Tuple[bytes, str]]) -> str:
+        """
+        Create a job for the pictures and queue them.
+        Raises a 429 past the user's queued pictures limit, a 503 past the process one.
+
+        Returns:
+            The job id
+        """
+        size = sum(len(data) for data, _ in pictures)
+        if self._queued_by_user.get(email, 0) + len(pictures) > SCAN_JOB_MAX_QUEUED_PER_USER:
+            raise HTTPException(status_code=429, detail="Too many pictures waiting to be scanned, retry later")
+        if self._queued_bytes + size > SCAN_JOB_MAX_QUEUED_BYTES:
+            raise HTTPException(status_code=503, detail="Scan queue is full, retry later")
+
+        job_id = await asyncio.to_thread(self.store.create, email, tiling, pictures)
+        for position, (data, _) in enumerate(pictures):
+            self._queued[(job_id, position)] = (email, len(data))
+            self._queue.put_nowait((job_id, position))
+        self._queued_bytes += size
+        self._queued_by_user[email] = self._queued_by_user.get(email, 0) + len(pictures)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """
+        Get a job with its overall status and the result of every picture
+        """
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None:
+            job['status'] = job_status([item['status'] for item in job['items']])
+        return job
+
+    async def _work(self):
+        while True:
+            job_id, position = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.store.update, job_id, position, RUNNING)
+                email, tiling, data, mime_type = await asyncio.to_thread(self.store.get_picture, job_id, position)
+                cards = await self.process(data, mime_type, email, bool(tiling))
+                await asyncio.to_thread(self.store.update, job_id, position, DONE, cards)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"scan job {job_id} picture {position} failed: {e}")
+                await asyncio.to_thread(
+                    self.store.update, job_id, position, FAILED, None, str(getattr(e, 'detail', e))
+                )
+            finally:
+                self._release(job_id, position)
+                self._queue.task_done()
+
+            if time.monotonic() - self._last_purge > PURGE_INTERVAL_SECONDS:
+                self._last_purge = time.monotonic()
+                await asyncio.to_thread(self.store.purge)
+
+    def _release(self, job_id: str, position: int):
+        """
+        Stop counting a processed picture against the queue limits
+        """
+        queued = self._queued.pop((job_id, position), None)
+        if queued is None:
+            # Queued again from the store on start, never counted
+            return
+        email, size = queued
+        self._queued_bytes -= size
+        self._queued_by_user[email] -= 1
+        if not self._queued_by_user[email]:
+            del self._queued_by_user[email]
+
+
+def create_job_store():
+    """
+    Build the job store configured by SCAN_JOB_STORE ("memory" or "disk")
+    """
+    if SCAN_JOB_STORE == "disk":
+        return DiskJobStore(SCAN_JOB_PATH)
+    return MemoryJobStore()
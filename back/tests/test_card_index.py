@@ -0,0 +1,39 @@
+from services.card_index import (
+    card_index_id,
+    card_index_ids,
+    card_sort_key,
+    normalize_card_number,
+    normalize_licence,
+    normalize_set_id,
+)
+
+
+def test_normalize():
+    assert normalize_licence(' Pokemon ') == 'pokemon'
+    assert normalize_licence('yugioh') is None
+    assert normalize_licence(None) is None
+    assert normalize_set_id(' sv6 ') == 'SV6'
+    assert normalize_set_id(None) == ''
+    assert normalize_card_number('078') == '78'
+    assert normalize_card_number(78) == '78'
+    assert normalize_card_number(' op08-001 ') == 'OP08-001'
+    assert normalize_card_number(None) == ''
+
+
+def test_card_sort_key():
+    assert card_sort_key('078') == 78
+    assert card_sort_key('OP08-001') == 1
+    assert card_sort_key('TG05') == 5
+    assert card_sort_key('SV-P') == 0
+    assert card_sort_key(None) == 0
+
+
+def test_card_index_id():
+    assert card_index_id('Pokemon', 'sv6', '052') == 'pokemon|SV6|52'
+    # Slashes are not allowed in document IDs
+    assert card_index_id('pokemon', 'S-P', '1/2') == 'pokemon|S-P|1-2'
+
+
+def test_card_index_ids_try_every_licence_when_unknown():
+    assert card_index_ids('one piece', 'op08', '001') == ['one piece|OP08|1']
+    assert card_index_ids(None, 'op08', '001') == ['pokemon|OP08|1', 'one piece|OP08|1']
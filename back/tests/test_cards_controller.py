@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+from unittest import mock
+
+with mock.patch('google.auth.default', return_value=(None, 'test')):
+    from controllers import cards_controller
+
+
+def fake_client(chunks, streamed):
+    """
+    Model client streaming chunks, setting streamed once the last one is sent
+    """
+    async def stream():
+        for text in chunks:
+            await asyncio.sleep(0)
+            yield SimpleNamespace(text=text)
+        streamed.set()
+
+    async def generate_content_stream(**kwargs):
+        return stream()
+
+    return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content_stream=generate_content_stream)))
+
+
+def test_cards_are_yielded_as_they_are_streamed(monkeypatch):
+    monkeypatch.setattr(cards_controller, 'scan_cache', None)
+
+    async def read():
+        streamed = asyncio.Event()
+        monkeypatch.setattr(cards_controller, 'client', fake_client(
+            ['[{"set_id": "SV6", "card_', 'number": "52"}, {"set_id"', ': "SV6", "card_number": "53"}]'],
+            streamed
+        ))
+        return [card async for card in cards_controller.generate_stream(b'picture', 'image/jpeg')]
+
+    assert asyncio.run(read()) == [
+        {'set_id': 'SV6', 'card_number': '52'},
+        {'set_id': 'SV6', 'card_number': '53'}
+    ]
+
+
+def test_model_slot_is_released_while_cards_are_consumed(monkeypatch):
+    monkeypatch.setattr(cards_controller, 'scan_cache', None)
+    semaphore = asyncio.Semaphore(1)
+    monkeypatch.setattr(cards_controller, 'gemini_semaphore', semaphore)
+
+    async def read_slowly():
+        streamed = asyncio.Event()
+        monkeypatch.setattr(cards_controller, 'client', fake_client(['[{"a": 1}, {"b": 2}, {"c": 3}]'], streamed))
+        stream = cards_controller.generate_stream(b'picture', 'image/jpeg')
+
+        await anext(stream)
+        # The consumer has not read the other cards yet, the model stream is done
+        await streamed.wait()
+        await asyncio.sleep(0)
+        released = not semaphore.locked()
+
+        await stream.aclose()
+        return released
+
+    assert asyncio.run(read_slowly())
+
+
+def test_model_slot_is_released_when_the_caller_stops_early(monkeypatch):
+    monkeypatch.setattr(cards_controller, 'scan_cache', None)
+    semaphore = asyncio.Semaphore(1)
+    monkeypatch.setattr(cards_controller, 'gemini_semaphore', semaphore)
+
+    async def stop_early():
+        streamed = asyncio.Event()
+        monkeypatch.setattr(cards_controller, 'client', fake_client(['[{"a": 1}, '] + ['{"b": 2}, '] * 50, streamed))
+        stream = cards_controller.generate_stream(b'picture', 'image/jpeg')
+
+        await anext(stream)
+        await stream.aclose()
+        await asyncio.sleep(0)
+        return semaphore.locked(), streamed.is_set()
+
+    assert asyncio.run(stop_early()) == (False, False)
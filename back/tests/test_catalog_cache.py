@@ -0,0 +1,63 @@
+import asyncio
+
+from services import catalog_cache as catalog_cache_module
+from services.catalog_cache import CatalogCache
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(catalog_cache_module.time, 'monotonic', lambda: now[0])
+    cache = CatalogCache(max_entries=10, ttl=60)
+
+    cache.set(('series', None), ['a'])
+    now[0] += 59
+    assert cache.get(('series', None)) == ['a']
+    now[0] += 2
+    assert cache.get(('series', None)) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CatalogCache(max_entries=2, ttl=60)
+
+    cache.set(('cards', 'a'), 1)
+    cache.set(('cards', 'b'), 2)
+    cache.get(('cards', 'a'))
+    cache.set(('cards', 'c'), 3)
+
+    assert cache.get(('cards', 'a')) == 1
+    assert cache.get(('cards', 'b')) is None
+    assert cache.get(('cards', 'c')) == 3
+
+
+def test_invalidate_by_prefix():
+    cache = CatalogCache(max_entries=10, ttl=60)
+    cache.set(('series', 'pokemon'), 1)
+    cache.set(('series', None), 2)
+    cache.set(('cards', 'a'), 3)
+    cache.set(('cards', 'a', 'page', None, 50), 4)
+
+    assert cache.invalidate('series', 'pokemon') == 1
+    assert cache.get(('series', None)) == 2
+    assert cache.invalidate('cards') == 2
+    assert cache.get(('cards', 'a')) is None
+    assert cache.invalidate() == 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = CatalogCache(max_entries=10, ttl=60)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0)
+        return ['card']
+
+    async def load_twice():
+        return await asyncio.gather(
+            cache.get_or_load(('cards', 'a'), loader),
+            cache.get_or_load(('cards', 'a'), loader)
+        )
+
+    assert asyncio.run(load_twice()) == [['card'], ['card']]
+    assert len(loads) == 1
+    assert cache.get(('cards', 'a')) == ['card']
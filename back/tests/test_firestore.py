@@ -0,0 +1,78 @@
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriterOptions
+from google.cloud.firestore_v1.types import firestore as firestore_types, write as write_types
+from google.rpc import code_pb2, status_pb2
+
+from services.firestore import FirestoreService
+
+
+def make_service(send):
+    """
+    FirestoreService whose bulk writers send their batches to send instead of Firestore, retrying immediately
+    """
+    db = firestore.Client(project='test', credentials=AnonymousCredentials(), database='test')
+    service = FirestoreService(db=db)
+    bulk_writer = db.bulk_writer
+
+    def patched_bulk_writer(*args, **kwargs):
+        # Retried writes are sent again without waiting
+        writer = bulk_writer(options=BulkWriterOptions(retry=BulkRetry.immediate))
+        writer._send = send
+        return writer
+
+    db.bulk_writer = patched_bulk_writer
+    return service
+
+
+def test_bulk_write_retries_then_reports_failures():
+    attempts = []
+
+    def send(batch):
+        attempts.append(len(batch))
+        return firestore_types.BatchWriteResponse(
+            write_results=[write_types.WriteResult() for _ in range(len(batch))],
+            status=[status_pb2.Status(code=code_pb2.ABORTED, message='contention') for _ in range(len(batch))]
+        )
+
+    service = make_service(send)
+    ref = service.db.collection('series').document('a')
+
+    failures = service.bulk_write([('set', ref, {'x': 1})], max_attempts=2)
+
+    assert sum(attempts) == 2
+    assert failures == [{'path': 'series/a', 'code': code_pb2.ABORTED, 'message': 'contention'}]
+
+
+def test_bulk_write_success():
+    def send(batch):
+        return firestore_types.BatchWriteResponse(
+            write_results=[write_types.WriteResult() for _ in range(len(batch))],
+            status=[status_pb2.Status(code=code_pb2.OK) for _ in range(len(batch))]
+        )
+
+    service = make_service(send)
+    ref = service.db.collection('series').document('a')
+
+    assert service.bulk_write([('set', ref, {'x': 1}), ('delete', ref, None)]) == []
+
+
+def test_batch_create_reports_failed_documents():
+    def send(batch):
+        paths = [ref.path for ref in batch._document_references.values()]
+        return firestore_types.BatchWriteResponse(
+            write_results=[write_types.WriteResult() for _ in paths],
+            status=[
+                status_pb2.Status(code=code_pb2.ABORTED if path.endswith('/b') else code_pb2.OK, message='contention')
+                for path in paths
+            ]
+        )
+
+    service = make_service(send)
+
+    ids, failures = service.batch_create_sub_collection_documents(
+        'series', 's', 'cards', [{'x': 1}, {'x': 2}], ['a', 'b']
+    )
+
+    assert ids == ['a', None]
+    assert [failure['path'] for failure in failures] == ['series/s/cards/b']
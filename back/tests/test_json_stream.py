@@ -0,0 +1,26 @@
+from services.json_stream import JsonArrayStreamParser
+
+
+def test_objects_are_returned_as_soon_as_complete():
+    parser = JsonArrayStreamParser()
+
+    assert parser.feed('[{"set_id": "SV6", ') == []
+    assert parser.feed('"card_number": "52"}, {"set_') == [{'set_id': 'SV6', 'card_number': '52'}]
+    assert parser.feed('id": "OP08"}]') == [{'set_id': 'OP08'}]
+
+
+def test_braces_and_quotes_inside_strings():
+    parser = JsonArrayStreamParser()
+
+    objects = parser.feed('[{"card_name": "Pikachu {V} \\"promo\\"", "extra": {"nested": "}"}}]')
+
+    assert objects == [{'card_name': 'Pikachu {V} "promo"', 'extra': {'nested': '}'}}]
+
+
+def test_text_split_on_every_character():
+    parser = JsonArrayStreamParser()
+    text = '```json\n[{"a": "x\\\\"}, {"b": 2}]\n```'
+
+    objects = [obj for char in text for obj in parser.feed(char)]
+
+    assert objects == [{'a': 'x\\'}, {'b': 2}]
@@ -0,0 +1,55 @@
+import io
+
+from PIL import Image
+
+from services import scan_cache as scan_cache_module
+from services.scan_cache import MemoryScanCacheBackend, ScanCache, dhash
+
+
+def make_cache(monkeypatch, key, max_distance=4, ttl=60):
+    """
+    ScanCache on a memory backend, hashing every picture to key
+    """
+    monkeypatch.setattr(scan_cache_module, 'dhash', lambda data: key)
+    return ScanCache(MemoryScanCacheBackend(max_entries=10), ttl=ttl, max_distance=max_distance)
+
+
+def test_exact_hash_hit(monkeypatch):
+    cache = make_cache(monkeypatch, 0b1010)
+    cache.store(0b1010, [{'card_number': '1'}])
+
+    assert cache.lookup(b'picture') == (0b1010, [{'card_number': '1'}])
+
+
+def test_closest_hash_within_max_distance(monkeypatch):
+    cache = make_cache(monkeypatch, 0b1111_0000, max_distance=2)
+    cache.store(0b1111_0011, ['two bits away'])
+    cache.store(0b1111_0001, ['one bit away'])
+    cache.store(0b0000_1111, ['far away'])
+
+    assert cache.lookup(b'picture') == (0b1111_0000, ['one bit away'])
+
+
+def test_miss_beyond_max_distance(monkeypatch):
+    cache = make_cache(monkeypatch, 0, max_distance=2)
+    cache.store(0b111, ['three bits away'])
+
+    assert cache.lookup(b'picture') == (0, None)
+
+
+def test_expired_entries_miss(monkeypatch):
+    cache = make_cache(monkeypatch, 1, ttl=-1)
+    cache.store(1, ['expired'])
+
+    assert cache.lookup(b'picture') == (1, None)
+    assert list(cache.backend.keys()) == []
+
+
+def test_dhash_of_a_recompressed_picture_is_close():
+    image = Image.linear_gradient('L').resize((400, 560)).rotate(20).convert('RGB')
+    png, jpeg = io.BytesIO(), io.BytesIO()
+    image.save(png, format='PNG')
+    image.save(jpeg, format='JPEG', quality=60)
+
+    assert (dhash(png.getvalue()) ^ dhash(jpeg.getvalue())).bit_count() <= 8
+    assert dhash(b'not a picture') is None
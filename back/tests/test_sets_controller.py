@@ -0,0 +1,65 @@
+import asyncio
+
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+
+from controllers import sets_controller
+from services.catalog_cache import CatalogCache
+
+db = firestore.Client(project='test', credentials=AnonymousCredentials(), database='test')
+
+
+def card(card_id, card_number, int_number=None, removed=False):
+    data = {
+        '_id': card_id,
+        'ref': db.document(f"series/s1/cards/{card_id}"),
+        'card_number': card_number,
+        'int_number': int_number
+    }
+    if removed:
+        data['removed'] = True
+    return data
+
+
+class FakeFirestoreService:
+    """
+    Serves the pages of a series ordered by int_number, recording the pages read
+    """
+
+    def __init__(self, cards):
+        self.cards = cards
+        self.pages_read = []
+
+    async def query_sub_collection_page(self, collection_name, document_id, sub_collection,
+                                        order_by, limit, start_after=None):
+        self.pages_read.append(start_after)
+        ids = [c['_id'] for c in self.cards]
+        start = ids.index(start_after) + 1 if start_after else 0
+        page = self.cards[start:start + limit]
+        return page, page[-1]['_id'] if len(page) == limit else None
+
+
+def test_pages_follow_the_cursor_with_the_owned_counts(monkeypatch):
+    monkeypatch.setattr(sets_controller, 'catalog_cache', CatalogCache(max_entries=10, ttl=60))
+
+    async def get_owned_counts(card_refs, email, firestore_service):
+        return {'series/s1/cards/c2': 3}
+
+    monkeypatch.setattr(sets_controller, 'get_owned_counts', get_owned_counts)
+    service = FakeFirestoreService([card('c1', '001', 1), card('c2', '002', 2), card('c3', 'TG03', removed=True)])
+
+    async def read_pages():
+        first, cursor = await sets_controller.fetch_cards_page('s1', 'a@b.c', service, limit=2)
+        second, last_cursor = await sets_controller.fetch_cards_page('s1', 'a@b.c', service, limit=2, start_after=cursor)
+        # Pages are cached per cursor
+        await sets_controller.fetch_cards_page('s1', 'a@b.c', service, limit=2, start_after=cursor)
+        return first, cursor, second, last_cursor
+
+    first, cursor, second, last_cursor = asyncio.run(read_pages())
+
+    assert [(c['_id'], c['int_number'], c['count']) for c in first] == [('c1', 1, 0), ('c2', 2, 3)]
+    assert cursor == 'c2'
+    # Cards not backfilled yet get their sort key from their number
+    assert [(c['_id'], c['int_number'], c['removed']) for c in second] == [('c3', 3, True)]
+    assert last_cursor is None
+    assert service.pages_read == [None, 'c2']
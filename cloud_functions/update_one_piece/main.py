@@ -1,7 +1,18 @@
+import os
 from datetime import datetime
 from functions_framework import http
 import requests
+from google.api_core.exceptions import GoogleAPICallError
+from services.card_index import card_sort_key, write_card_index
+from services.catalog import invalidate_catalog
 from services.firestore import FirestoreService
+from services.http_cache import HttpCache
+from services.sync import card_hash, sync_serie_cards
+
+# Timeout of each dotgg request in seconds
+SCRAPE_TIMEOUT = float(os.getenv('SCRAPE_TIMEOUT', '60'))
+
+http_cache = HttpCache(requests.Session())
 
 
 def process_cards(cards, headers):
@@ -17,6 +28,7 @@ def process_cards(cards, headers):
     for card in cards:
         card_obj = {
             "card_number": card[useful_headers['card_number']],
+            "int_number": card_sort_key(card[useful_headers['card_number']]),
             "set_id": card[useful_headers['set_id']],
             "card_name": card[useful_headers['card_name']],
             "card_img": f"https://static.dotgg.gg/onepiece/card/{card[useful_headers['img_index']]}.webp"
@@ -33,28 +45,55 @@ def process_cards(cards, headers):
 @http
 def main(request):
 
-    firestore_service = FirestoreService()
+    sets_page = http_cache.get('https://api.dotgg.gg/cgfw/getsets?game=one piece', timeout=SCRAPE_TIMEOUT)
+    cards_page = http_cache.get(
+        'https://api.dotgg.gg/cgfw/getcards?game=onepiece&mode=indexed', timeout=SCRAPE_TIMEOUT)
 
-    r = requests.get('https://api.dotgg.gg/cgfw/getsets?game=one piece')
-    sets = r.json()
+    if not sets_page.changed and not cards_page.changed:
+        print("sets and cards unchanged since the last import, skipping")
+        return {"status": "unchanged"}
 
-    r = requests.get(
-        'https://api.dotgg.gg/cgfw/getcards?game=onepiece&mode=indexed')
-    cards_response = r.json()
+    firestore_service = FirestoreService()
+    sets = sets_page.json()
+    cards_response = cards_page.json()
 
     all_cards = process_cards(cards=cards_response.get(
         'data'), headers=cards_response.get('names'))
 
-    for card_set in sets:
-        existing_serie = firestore_service.query_documents(
+    # Existing series are read once instead of one query per set
+    existing = {
+        serie.get('set_id'): serie.get('_id')
+        for serie in firestore_service.query_documents(
             'series',
             filters=[
-                ("set_id", "==", card_set.get('code'))
+                ("licence", "==", "one piece")
             ]
         )
+    }
 
-        if not existing_serie:
-            print(f"need to create {card_set.get('code')}")
+    # Sets not fully written, the responses are then processed again next run
+    failed = 0
+    for card_set in sets:
+        cards = all_cards.get(card_set.get('code'), [])
+
+        if card_set.get('code') in existing:
+            # Only the cards that changed since the last import are written
+            summary = sync_serie_cards(
+                firestore_service,
+                "one piece",
+                existing[card_set.get('code')],
+                card_set.get('code'),
+                cards
+            )
+            print(f"{card_set.get('code')} synced: {summary}")
+            if summary.get('failed'):
+                failed += 1
+            continue
+
+        print(f"need to create {card_set.get('code')}")
+        for card in cards:
+            card['content_hash'] = card_hash(card)
+        try:
             created_serie_id = firestore_service.create_document(
                 "series",
                 {
@@ -63,20 +102,44 @@ def main(request):
                     "serie_logo": f"https://static.dotgg.gg/onepiece/set-logo/{card_set.get('code')}.webp",
                     "serie_name": card_set.get('name'),
                     "set_id": card_set.get('code'),
-                    "symbol_img": ""
+                    "symbol_img": "",
+                    "card_count": len(cards)
                 }
             )
-            if created_serie_id:
-                print(f"created {card_set.get('code')}")
-                print(f"document id: {created_serie_id}")
-                firestore_service.batch_create_sub_collection_documents(
-                    "series",
-                    created_serie_id,
-                    "cards",
-                    all_cards[card_set.get('code')]
-                )
-                print(f"created {len(all_cards[card_set.get('code')])} cards")
-        else:
-            print(f"{card_set.get('code')} already exists, skipping")
-
-    return {"status": "ok"}
+        except GoogleAPICallError as e:
+            print(f"could not create {card_set.get('code')}: {e}")
+            failed += 1
+            continue
+
+        print(f"created {card_set.get('code')}")
+        print(f"document id: {created_serie_id}")
+        card_ids, card_failures = firestore_service.batch_create_sub_collection_documents(
+            "series",
+            created_serie_id,
+            "cards",
+            cards
+        )
+        # Only the cards actually written are indexed
+        written = [(card, card_id) for card, card_id in zip(cards, card_ids) if card_id]
+        print(f"created {len(written)}/{len(cards)} cards")
+        indexed = write_card_index(
+            firestore_service,
+            "one piece",
+            created_serie_id,
+            card_set.get('code'),
+            [card for card, _ in written],
+            [card_id for _, card_id in written]
+        )
+        print(f"indexed {indexed} cards")
+        # The serie exists now: the next run syncs the missing cards into it
+        if card_failures:
+            failed += 1
+
+    if failed:
+        print(f"{failed} sets failed, sets and cards will be imported again next run")
+    else:
+        http_cache.save(sets_page)
+        http_cache.save(cards_page)
+    invalidate_catalog('one piece')
+
+    return {"status": "ok", "failed": failed}
@@ -0,0 +1,29 @@
+import os
+import requests
+
+
+def invalidate_catalog(licence: str = None):
+    """
+    Ask the back end to drop its cached catalog after the import wrote new data.
+
+    Does nothing when BACKEND_URL is not configured, and never fails the import:
+    cached entries expire on their own after the back end TTL. Only the back end
+    instance answering the call is invalidated, the others stay stale until that TTL.
+    """
+    backend_url = os.getenv('BACKEND_URL')
+    if not backend_url:
+        return False
+
+    try:
+        r = requests.post(
+            f"{backend_url.rstrip('/')}/api/catalog/invalidate",
+            params={'licence': licence} if licence else None,
+            headers={'X-Catalog-Token': os.getenv('CATALOG_INVALIDATION_TOKEN', '')},
+            timeout=10
+        )
+        r.raise_for_status()
+        print(f"Catalog cache invalidated: {r.json()}")
+        return True
+    except requests.RequestException as e:
+        print(f"Could not invalidate catalog cache: {e}")
+        return False
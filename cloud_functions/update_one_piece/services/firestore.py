@@ -1,4 +1,4 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 from google.cloud import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 
@@ -165,10 +165,61 @@ class FirestoreService:
             doc_ref = sub_collection_ref.add(data)[1]
             return doc_ref.id
         
+    def bulk_write(self, operations: List[tuple], max_attempts: int = 5) -> List[Dict[str, Any]]:
+        """
+        Apply many writes with a BulkWriter: operations are sent in parallel
+        batches, throttled with a gradual ramp-up, and failed writes (contention,
+        quota) are retried with backoff. No limit on the number of operations.
+
+        Args:
+            operations: List of (operation, document reference, data) tuples, operation
+                        being "create", "set", "merge", "update" or "delete" (data is None)
+            max_attempts: Attempts of a write before reporting it as failed
+
+        Returns:
+            List of the failed writes: {'path', 'code', 'message'}
+        """
+        failures = []
+
+        def on_write_error(failure, bulk_writer) -> bool:
+            # attempts counts the retries already made, the first send excluded
+            if failure.attempts + 1 < max_attempts:
+                return True
+            failures.append({
+                'path': failure.operation.reference.path,
+                'code': failure.code,
+                'message': failure.message
+            })
+            return False
+
+        bulk_writer = self.db.bulk_writer()
+        bulk_writer.on_write_error(on_write_error)
+        for operation, doc_ref, data in operations:
+            if operation == 'create':
+                bulk_writer.create(doc_ref, data)
+            elif operation == 'set':
+                bulk_writer.set(doc_ref, data)
+            elif operation == 'merge':
+                bulk_writer.set(doc_ref, data, merge=True)
+            elif operation == 'update':
+                bulk_writer.update(doc_ref, data)
+            elif operation == 'delete':
+                bulk_writer.delete(doc_ref)
+            else:
+                raise ValueError(f"Unknown write operation: {operation}")
+        # Wait for the remaining writes and their retries before closing: a closed
+        # writer rejects the retried operations
+        bulk_writer.flush()
+        bulk_writer.close()
+
+        for failure in failures:
+            print(f"Write failed on {failure['path']}: {failure['code']} {failure['message']}")
+        return failures
+
     def batch_delete_sub_collection_documents(self, collection_name: str, document_id: str,
-                                         sub_collection: str, sub_document_ids: List[str]) -> bool:
+                                              sub_collection: str, sub_document_ids: List[str]) -> bool:
         """
-        Delete multiple documents from a sub-collection using a batch operation.
+        Delete multiple documents from a sub-collection with bulk_write.
 
         Args:
             collection_name: Name of the parent collection
@@ -177,30 +228,26 @@ class FirestoreService:
             sub_document_ids: List of document IDs to delete from the sub-collection
 
         Returns:
-            True if batch deletion was successful
+            True if every document was deleted
         """
         if not sub_document_ids:
             return True  # Nothing to delete
-            
-        batch = self.db.batch()
+
         sub_collection_ref = self.db.collection(collection_name).document(document_id)\
             .collection(sub_collection)
-        
-        for sub_doc_id in sub_document_ids:
-            doc_ref = sub_collection_ref.document(sub_doc_id)
-            batch.delete(doc_ref)
-        
-        # Commit the batch
-        batch.commit()
-        
-        return True
+
+        failures = self.bulk_write([
+            ('delete', sub_collection_ref.document(sub_doc_id), None) for sub_doc_id in sub_document_ids
+        ])
+        return not failures
 
 
     def batch_create_sub_collection_documents(self, collection_name: str, document_id: str,
                                               sub_collection: str, documents_data: List[Dict[str, Any]],
-                                              document_ids: Optional[List[str]] = None) -> List[str]:
+                                              document_ids: Optional[List[str]] = None
+                                              ) -> Tuple[List[Optional[str]], List[Dict[str, Any]]]:
         """
-        Create multiple documents in a sub-collection using a batch operation.
+        Create multiple documents in a sub-collection with bulk_write.
 
         Args:
             collection_name: Name of the parent collection
@@ -211,32 +258,53 @@ class FirestoreService:
                          (must match length of documents_data if provided)
 
         Returns:
-            List of IDs of the created documents
+            IDs of the documents in the order of documents_data, None for the ones
+            that could not be written, and the failed writes of bulk_write
         """
-        batch = self.db.batch()
         sub_collection_ref = self.db.collection(collection_name).document(document_id)\
             .collection(sub_collection)
-        created_ids = []
 
         # Check if document_ids is provided and has the correct length
         if document_ids and len(document_ids) != len(documents_data):
             raise ValueError(
                 "Length of document_ids must match length of documents_data")
 
-        for i, data in enumerate(documents_data):
-            if document_ids:
-                doc_ref = sub_collection_ref.document(document_ids[i])
-                created_ids.append(document_ids[i])
-            else:
-                doc_ref = sub_collection_ref.document()
-                created_ids.append(doc_ref.id)
+        if document_ids:
+            doc_refs = [sub_collection_ref.document(doc_id) for doc_id in document_ids]
+        else:
+            doc_refs = [sub_collection_ref.document() for _ in documents_data]
+
+        failures = self.bulk_write([('set', doc_ref, data) for doc_ref, data in zip(doc_refs, documents_data)])
+
+        failed_paths = {failure['path'] for failure in failures}
+        return [None if doc_ref.path in failed_paths else doc_ref.id for doc_ref in doc_refs], failures
 
-            batch.set(doc_ref, data)
+    def batch_set_documents(self, collection_name: str, documents_data: List[Dict[str, Any]],
+                            document_ids: List[str], merge: bool = False) -> List[str]:
+        """
+        Create or overwrite multiple documents of a collection with bulk_write.
 
-        # Commit the batch
-        batch.commit()
+        Args:
+            collection_name: Name of the collection
+            documents_data: List of document data dictionaries
+            document_ids: List of IDs for the documents (must match length of documents_data)
+            merge: Merge data into existing documents instead of overwriting them
+
+        Returns:
+            List of IDs of the written documents
+        """
+        if len(document_ids) != len(documents_data):
+            raise ValueError(
+                "Length of document_ids must match length of documents_data")
+
+        collection_ref = self.db.collection(collection_name)
+        failures = self.bulk_write([
+            ('merge' if merge else 'set', collection_ref.document(doc_id), data)
+            for doc_id, data in zip(document_ids, documents_data)
+        ])
 
-        return created_ids
+        failed_ids = {failure['path'].split('/')[-1] for failure in failures}
+        return [doc_id for doc_id in document_ids if doc_id not in failed_ids]
 
     def update_sub_collection_document(self, collection_name: str, document_id: str,
                                        sub_collection: str, sub_document_id: str,
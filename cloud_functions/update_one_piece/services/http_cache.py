@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+
+# Directory of the cached responses, empty to disable the cache.
+# /tmp survives between invocations of a warm function instance only.
+HTTP_CACHE_DIR = os.getenv('HTTP_CACHE_DIR', '/tmp/http_cache')
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    text: str
+    # False when the content is the same as the last saved one
+    changed: bool
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class HttpCache:
+    """
+    On-disk cache of GET responses with their validators.
+
+    Requests are sent with If-None-Match / If-Modified-Since from the saved
+    response, so an unchanged page costs a 304 without body. Servers ignoring
+    validators are compared on content. A response is only saved by save(),
+    once the caller has processed it, so a failed import is retried next run.
+    """
+
+    def __init__(self, session: requests.Session, cache_dir: str = HTTP_CACHE_DIR):
+        self.session = session
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+    def _load(self, url: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, url: str, **kwargs) -> CachedResponse:
+        """
+        Conditional GET of url, extra arguments are passed to session.get
+        """
+        cached = self._load(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        r = self.session.get(url, headers=headers, **kwargs)
+        if r.status_code == 304 and cached:
+            return CachedResponse(url, cached['text'], False, cached.get('etag'), cached.get('last_modified'))
+        r.raise_for_status()
+
+        return CachedResponse(
+            url,
+            r.text,
+            cached is None or cached['text'] != r.text,
+            r.headers.get('ETag'),
+            r.headers.get('Last-Modified')
+        )
+
+    def save(self, response: CachedResponse):
+        """
+        Save a processed response, later requests of its url become conditional
+        """
+        if not self.cache_dir or not response.changed:
+            return
+        path = self._path(response.url)
+        # Write then rename so a concurrent reader never sees a partial file
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump({
+                'url': response.url,
+                'etag': response.etag,
+                'last_modified': response.last_modified,
+                'text': response.text
+            }, f)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,156 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Set, Tuple
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from services.card_index import CARD_INDEX_COLLECTION, build_card_index, card_index_id, write_card_index
+
+# Maximum number of values of a Firestore 'in' filter
+IN_QUERY_LIMIT = 30
+
+# Fields of a card compared to detect a change
+HASHED_FIELDS = ('card_name', 'card_img', 'card_number', 'int_number', 'set_id')
+
+
+def card_hash(card: Dict[str, Any]) -> str:
+    """
+    Content hash of the imported fields of a card
+    """
+    content = json.dumps({field: card.get(field) for field in HASHED_FIELDS}, sort_keys=True, default=str)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def card_key(card: Dict[str, Any]) -> str:
+    """
+    Identity of a card within a serie: its picture, unique per card version
+    """
+    return card.get('card_img') or f"number:{card.get('card_number')}"
+
+
+def diff_cards(stored: List[Dict[str, Any]], cards: List[Dict[str, Any]]) -> Tuple[list, list, list]:
+    """
+    Compare the cards of a serie in Firestore with the freshly imported ones.
+
+    Returns:
+        Cards to insert, (stored card, card) pairs to update, stored cards to delete
+    """
+    stored_by_key = {}
+    deletes = []
+    for stored_card in stored:
+        if card_key(stored_card) in stored_by_key:
+            # Duplicate left by a previous import
+            deletes.append(stored_card)
+        else:
+            stored_by_key[card_key(stored_card)] = stored_card
+
+    inserts, updates = [], []
+    seen = set()
+    for card in cards:
+        key = card_key(card)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        stored_card = stored_by_key.pop(key, None)
+        if stored_card is None:
+            inserts.append(card)
+        elif stored_card.get('removed') or \
+                (stored_card.get('content_hash') or card_hash(stored_card)) != card['content_hash']:
+            # Rewriting a card flagged as removed brings it back
+            updates.append((stored_card, card))
+
+    deletes.extend(stored_by_key.values())
+    return inserts, updates, deletes
+
+
+def referenced_card_paths(firestore_service, card_refs: list) -> Set[str]:
+    """
+    Paths of the given cards held in a user collection (collections/{email}/cards).
+    Entries are matched on their card_ref, so legacy entries without series_id are found too.
+    """
+    referenced = set()
+    for i in range(0, len(card_refs), IN_QUERY_LIMIT):
+        query = firestore_service.db.collection_group('cards')\
+            .where(filter=FieldFilter('card_ref', 'in', card_refs[i:i + IN_QUERY_LIMIT]))\
+            .select(['card_ref'])
+        referenced.update(doc.to_dict()['card_ref'].path for doc in query.stream())
+    return referenced
+
+
+def sync_serie_cards(firestore_service, licence: str, serie_id: str, set_id: str,
+                     cards: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Bring the cards of an existing serie in line with the imported ones, writing
+    only the inserted, updated and deleted cards with a bulk writer.
+    Updated cards keep their document ID so collection entries stay valid.
+    The card_index entries and card_count of the serie are rewritten when something changed.
+
+    Cards to delete that are still held in a user collection are kept and
+    flagged as removed instead, so collection entries never point to a
+    missing card. They leave the card_index but still count in the card_count
+    of the serie, as the back end lists them flagged as removed.
+
+    An import without any card is ignored, it is most likely a scraping failure
+    and would otherwise delete the whole serie.
+
+    Returns:
+        Number of inserted, updated, deleted, kept (removed but referenced), unchanged and failed cards
+    """
+    if not cards:
+        return {'inserted': 0, 'updated': 0, 'deleted': 0, 'kept': 0, 'unchanged': None, 'failed': 0}
+
+    for card in cards:
+        card['content_hash'] = card_hash(card)
+
+    stored = firestore_service.query_sub_collection('series', serie_id, 'cards')
+    inserts, updates, deletes = diff_cards(stored, cards)
+
+    kept = []
+    if deletes:
+        # Raises without the collection group index on card_ref, before anything is deleted
+        referenced = referenced_card_paths(firestore_service, [stored_card.get('ref') for stored_card in deletes])
+        kept = [stored_card for stored_card in deletes if stored_card.get('ref').path in referenced]
+        deletes = [stored_card for stored_card in deletes if stored_card.get('ref').path not in referenced]
+        for stored_card in kept:
+            print(f"Keeping {stored_card.get('ref').path}: removed from the source but held in a collection")
+    # Cards already flagged by a previous import are not written again
+    newly_kept = [stored_card for stored_card in kept if not stored_card.get('removed')]
+
+    summary = {
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'deleted': len(deletes),
+        'kept': len(kept),
+        'unchanged': len(stored) - len(updates) - len(deletes) - len(kept)
+    }
+    if not inserts and not updates and not deletes and not newly_kept:
+        return {**summary, 'failed': 0}
+
+    cards_ref = firestore_service.db.collection('series').document(serie_id).collection('cards')
+    operations = [('set', cards_ref.document(), card) for card in inserts]
+    operations += [('set', stored_card.get('ref'), card) for stored_card, card in updates]
+    operations += [('delete', stored_card.get('ref'), None) for stored_card in deletes]
+    operations += [('merge', stored_card.get('ref'), {'removed': True}) for stored_card in newly_kept]
+    summary['failed'] = len(firestore_service.bulk_write(operations))
+
+    # Current cards of the serie, to rebuild its index entries
+    inserted_ids = [doc_ref.id for _, doc_ref, _ in operations[:len(inserts)]]
+    deleted_ids = {stored_card.get('_id') for stored_card in deletes + kept}
+    current = {
+        card_key(stored_card): ({k: v for k, v in stored_card.items() if k not in ('_id', 'ref')}, stored_card.get('_id'))
+        for stored_card in stored if stored_card.get('_id') not in deleted_ids
+    }
+    current.update({card_key(card): (card, card_id) for card, card_id in zip(inserts, inserted_ids)})
+    current.update({card_key(card): (card, stored_card.get('_id')) for stored_card, card in updates})
+    current_cards = [card for card, _ in current.values()]
+    current_ids = [card_id for _, card_id in current.values()]
+
+    entries = build_card_index(licence, serie_id, set_id, current_cards, current_ids)
+    stale = {card_index_id(licence, set_id, stored_card.get('card_number')) for stored_card in stored} - set(entries)
+    for doc_id in stale:
+        firestore_service.delete_document(CARD_INDEX_COLLECTION, doc_id)
+    write_card_index(firestore_service, licence, serie_id, set_id, current_cards, current_ids)
+
+    firestore_service.update_document('series', serie_id, {'card_count': len(current_cards) + len(kept)})
+    return summary
@@ -0,0 +1,86 @@
+import pytest
+import requests
+
+from services.http_cache import HttpCache
+
+URL = 'https://api.dotgg.gg/cgfw/getsets?game=one piece'
+
+
+class FakeResponse:
+    def __init__(self, status_code, text='', headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+
+class FakeSession:
+    """
+    Session answering the queued responses, recording the request headers
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.headers = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.headers.append(headers)
+        return self.responses.pop(0)
+
+
+def test_unchanged_page_is_answered_from_the_cache(tmp_path):
+    session = FakeSession(
+        FakeResponse(200, 'page', {'ETag': '"v1"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}),
+        FakeResponse(304)
+    )
+    cache = HttpCache(session, str(tmp_path))
+
+    first = cache.get(URL, timeout=30)
+    assert first.changed
+    cache.save(first)
+    second = cache.get(URL, timeout=30)
+
+    assert session.headers[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert not second.changed
+    assert second.text == 'page'
+
+
+def test_same_content_without_validators_is_unchanged(tmp_path):
+    session = FakeSession(FakeResponse(200, 'page'), FakeResponse(200, 'page'), FakeResponse(200, 'new page'))
+    cache = HttpCache(session, str(tmp_path))
+
+    cache.save(cache.get(URL))
+
+    assert session.headers[0] == {}
+    assert not cache.get(URL).changed
+    assert cache.get(URL).changed
+
+
+def test_response_not_saved_is_fetched_again(tmp_path):
+    session = FakeSession(FakeResponse(200, 'page', {'ETag': '"v1"'}), FakeResponse(200, 'page', {'ETag': '"v1"'}))
+    cache = HttpCache(session, str(tmp_path))
+
+    cache.get(URL)
+    # The import failed, nothing was saved
+    assert cache.get(URL).changed
+    assert session.headers[1] == {}
+
+
+def test_errors_are_raised(tmp_path):
+    cache = HttpCache(FakeSession(FakeResponse(500)), str(tmp_path))
+
+    with pytest.raises(requests.HTTPError):
+        cache.get(URL)
+
+
+def test_disabled_cache(tmp_path):
+    session = FakeSession(FakeResponse(200, 'page', {'ETag': '"v1"'}), FakeResponse(200, 'page'))
+    cache = HttpCache(session, '')
+
+    cache.save(cache.get(URL))
+
+    assert cache.get(URL).changed
+    assert session.headers[1] == {}
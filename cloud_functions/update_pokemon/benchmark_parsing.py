@@ -0,0 +1,100 @@
+import os
+import sys
+import timeit
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+from services.card_index import card_sort_key
+from services.pokecardex import parse_serie_page, parse_series
+
+# Compare the BeautifulSoup parsing used before services/pokecardex.py with the lxml one.
+# Usage: python benchmark_parsing.py [series_list.html serie_page.html] [iterations]
+# Defaults to the saved pokecardex pages of tests/fixtures. Both parsers must return
+# the same series and cards, and at least one of each, before any timing is reported.
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'tests', 'fixtures')
+
+
+def parse_series_bs4(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    series = []
+    for serie_soup in soup.find_all('div', {'class': 'serie-container'}):
+        symbol = serie_soup.find('img', {'class': 'symbole-jp'})
+        symbol_img = symbol.get('src')
+        series.append({
+            'set_id': os.path.splitext(os.path.basename(symbol_img))[0] if symbol_img else None,
+            'symbol_img': symbol_img,
+            'serie_name': symbol.get('alt'),
+            'serie_logo': serie_soup.find('img', {'class': 'serie-logo-jp'}).get('src'),
+            'licence': 'pokemon'
+        })
+    return series
+
+
+def parse_serie_page_bs4(text, serie):
+    soup = BeautifulSoup(text, 'html.parser')
+    date = soup.find('div', {'class': 'd-flex align-items-center d-none d-lg-block justify-content-lg-start'})
+    if date:
+        date_text = date.text.strip()
+        try:
+            serie['date'] = datetime.strptime(date_text, "%d/%m/%Y")
+        except ValueError:
+            serie['date'] = date_text
+
+    cards = []
+    for card_soup in soup.find_all('img', {'class': 'img-fluid br-10 dark-shadow'}):
+        src = card_soup.get('src')
+        card_number = os.path.splitext(os.path.basename(src))[0] if src else None
+        cards.append({
+            'card_name': card_soup.get('alt'),
+            'card_img': src,
+            'card_number': card_number,
+            'int_number': card_sort_key(card_number),
+            'set_id': serie.get('set_id')
+        })
+    return cards
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def parse_serie(parser, text):
+    """
+    Cards and serie fields (release date) parsed from a serie page
+    """
+    serie = {'set_id': 'SV6'}
+    cards = parser(text, serie)
+    return cards, serie
+
+
+paths = [arg for arg in sys.argv[1:] if not arg.isdigit()]
+iterations = next((int(arg) for arg in sys.argv[1:] if arg.isdigit()), 200)
+series_path, serie_path = paths or [
+    os.path.join(FIXTURES, 'pokecardex_series.html'),
+    os.path.join(FIXTURES, 'pokecardex_serie.html')
+]
+
+benchmarks = [
+    ('series list', series_path, parse_series_bs4, parse_series),
+    ('serie page', serie_path, lambda text: parse_serie(parse_serie_page_bs4, text),
+     lambda text: parse_serie(parse_serie_page, text)),
+]
+
+for name, path, legacy, parser in benchmarks:
+    text = read(path)
+    legacy_result, result = legacy(text), parser(text)
+    items = result[0] if isinstance(result, tuple) else result
+    if not items:
+        sys.exit(f"{name}: no item found in {path}, it is not a pokecardex page")
+    if legacy_result != result:
+        sys.exit(f"{name}: bs4 and lxml results differ on {path}")
+
+    legacy_time = timeit.timeit(lambda: legacy(text), number=iterations) / iterations
+    lxml_time = timeit.timeit(lambda: parser(text), number=iterations) / iterations
+    print(
+        f"{name} ({path}, {len(text)} characters, {len(items)} items, same results): "
+        f"bs4 {legacy_time * 1000:.2f} ms, lxml {lxml_time * 1000:.2f} ms, x{legacy_time / lxml_time:.1f}"
+    )
@@ -1,92 +1,42 @@
-import os
 import re
 import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
+from google.api_core.exceptions import GoogleAPICallError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services.card_index import write_card_index
+from services.catalog import invalidate_catalog
 from services.firestore import FirestoreService
+from services.http import SCRAPE_CONCURRENCY, SCRAPE_TIMEOUT, session
+from services.http_cache import HttpCache
+from services.pokecardex import parse_serie_page, parse_series
+from services.sync import card_hash, sync_serie_cards
 from functions_framework import http
 
 from services.helpers import extract_product_id
 
+http_cache = HttpCache(session)
+
 
 def get_all_sets_pokemon():
     """
     Get all Pokemon TCG sets
     """
-    r = requests.get('https://www.pokecardex.com/series/jp')
-    soup = BeautifulSoup(r.text, 'html.parser')
-    series_soup = soup.find_all('div', {'class': 'serie-container'})
-    series = []
-    for serie_soup in series_soup:
-        symbol = serie_soup.find('img', {'class': 'symbole-jp'})
-        symbol_img = symbol.get('src')
-        serie_name = symbol.get('alt')
-
-        if symbol_img:
-            # Extract the filename without extension from the URL
-            filename = os.path.basename(symbol_img)
-            # Remove the file extension
-            set_id = os.path.splitext(filename)[0]
-        else:
-            set_id = None
-
-        serie_logo = serie_soup.find(
-            'img', {'class': 'serie-logo-jp'}).get('src')
-        # Add to series list
-        series.append({
-            'set_id': set_id,
-            'symbol_img': symbol_img,
-            'serie_name': serie_name,
-            'serie_logo': serie_logo,
-            'licence': 'pokemon'
-        })
-
-    return series
-
-
-def get_cards(serie):
+    r = http_cache.get('https://www.pokecardex.com/series/jp', timeout=SCRAPE_TIMEOUT)
+    # The list is parsed on every run, only its download is saved by the cache
+    http_cache.save(r)
+    return parse_series(r.text)
+
+
+def get_cards(serie, skip_unchanged=False):
     """
-    Get all cards from a serie
+    Get all cards from a serie, with the page response to save in the HTTP cache once imported.
+    With skip_unchanged, cards are None when the page did not change since the last import.
     """
-    r = requests.get(
-        f"https://www.pokecardex.com/series/jp/{serie.get('set_id')}")
-    soup = BeautifulSoup(r.text, 'html.parser')
-    date = soup.find('div',
-                     {
-                         'class': 'd-flex align-items-center d-none d-lg-block justify-content-lg-start'
-                     }
-                     )
-    if date:
-        date_text = date.text.strip()
-        try:
-            # Assuming the date format is something like "DD Month YYYY"
-            # Adjust the format string to match your actual date format
-            parsed_date = datetime.strptime(date_text, "%d/%m/%Y")
-            # Firestore will convert this to a timestamp
-            serie['date'] = parsed_date
-        except ValueError:
-            # Fallback if parsing fails
-            serie['date'] = date_text
-
-    cards_soup = soup.find_all('img', {'class': 'img-fluid br-10 dark-shadow'})
-    cards = []
-
-    for card_soup in cards_soup:
-
-        if card_soup.get('src'):
-            # Extract the filename without extension from the URL
-            filename = os.path.basename(card_soup.get('src'))
-            # Remove the file extension
-            card_number = os.path.splitext(filename)[0]
-        else:
-            card_number = None
-        cards.append({
-            'card_name': card_soup.get('alt'),
-            'card_img': card_soup.get('src'),
-            'card_number': card_number,
-            'set_id': serie.get('set_id')
-        })
-    return serie, cards
+    r = http_cache.get(
+        f"https://www.pokecardex.com/series/jp/{serie.get('set_id')}", timeout=SCRAPE_TIMEOUT)
+    if skip_unchanged and not r.changed:
+        return serie, None, r
+    cards = parse_serie_page(r.text, serie)
+    return serie, cards, r
 
 
 @http
@@ -94,36 +44,89 @@ def main(request):
     firestore_service = FirestoreService()
     series = get_all_sets_pokemon()
 
-    for i, serie in enumerate(series):
-        print(f"{i + 1}/{len(series)}: {serie.get(('serie_name'))}")
-        existing_serie = firestore_service.query_documents(
+    # Existing series are read once instead of one query per scraped series
+    existing = {
+        (serie.get('set_id'), serie.get('licence')): serie.get('_id')
+        for serie in firestore_service.query_documents(
             "series",
-            filters=[
-                ('set_id', '==', serie.get('set_id')),
-                ('licence', '==', serie.get('licence'))
-            ]
+            filters=[('licence', '==', 'pokemon')]
         )
-
-        if not existing_serie:
-            serie, cards = get_cards(serie)
-
-            print('serie does not exist, creating')
-            created_serie_id = firestore_service.create_document(
-                "series", serie)
-            print(f"Serie created: {created_serie_id}")
-
-            if created_serie_id:
-
-                firestore_service.batch_create_sub_collection_documents(
-                    "series",
-                    created_serie_id,
-                    "cards",
+    }
+    print(f"{len(series)} series found, {len(existing)} already imported")
+
+    # Series pages are scraped in parallel, then written one at a time as they arrive.
+    # Pages of imported series that did not change since the last run are skipped.
+    changed = 0
+    with ThreadPoolExecutor(max_workers=SCRAPE_CONCURRENCY) as executor:
+        futures = [
+            executor.submit(get_cards, serie, (serie.get('set_id'), serie.get('licence')) in existing)
+            for serie in series
+        ]
+        for i, future in enumerate(as_completed(futures)):
+            try:
+                serie, cards, page = future.result()
+            except requests.RequestException as e:
+                print(f"Could not scrape serie: {e}")
+                continue
+
+            print(f"{i + 1}/{len(series)}: {serie.get('serie_name')}")
+            if cards is None:
+                print("Serie page unchanged, skipping")
+                continue
+
+            changed += 1
+            existing_serie_id = existing.get((serie.get('set_id'), serie.get('licence')))
+            if existing_serie_id:
+                # Only the cards that changed since the last import are written
+                summary = sync_serie_cards(
+                    firestore_service,
+                    serie.get('licence'),
+                    existing_serie_id,
+                    serie.get('set_id'),
                     cards
                 )
-                print(f"Cards created: {len(cards)}")
-        print(f"{i + 1}/{len(series)}: {serie} done")
+                print(f"Serie synced: {summary}")
+                if not summary.get('failed'):
+                    http_cache.save(page)
+                continue
+
+            for card in cards:
+                card['content_hash'] = card_hash(card)
+            serie['card_count'] = len(cards)
+            try:
+                created_serie_id = firestore_service.create_document(
+                    "series", serie)
+            except GoogleAPICallError as e:
+                print(f"Could not create serie: {e}")
+                continue
+            print(f"Serie created: {created_serie_id}")
 
-    return "Series created"
+            card_ids, card_failures = firestore_service.batch_create_sub_collection_documents(
+                "series",
+                created_serie_id,
+                "cards",
+                cards
+            )
+            # Only the cards actually written are indexed
+            written = [(card, card_id) for card, card_id in zip(cards, card_ids) if card_id]
+            print(f"Cards created: {len(written)}/{len(cards)}")
+            indexed = write_card_index(
+                firestore_service,
+                serie.get('licence'),
+                created_serie_id,
+                serie.get('set_id'),
+                [card for card, _ in written],
+                [card_id for _, card_id in written]
+            )
+            print(f"Cards indexed: {indexed}")
+            # The page is scraped again next run, syncing the missing cards into the created serie
+            if not card_failures:
+                http_cache.save(page)
+
+    if changed:
+        invalidate_catalog('pokemon')
+
+    return "Series synced"
 
 
 @http
@@ -186,5 +189,3 @@ def update_prices(request=None):
 
 def sanitize_card_name(name):
     return name.replace('—', '').strip()
-
-update_prices()
@@ -0,0 +1,89 @@
+import re
+from typing import Any, Dict, List
+
+CARD_INDEX_COLLECTION = "card_index"
+
+
+def normalize_card_number(card_number) -> str:
+    """
+    Normalize a card number, dropping leading zeros of purely numeric ones
+    (e.g. "078" -> "78", "op08-001" -> "OP08-001")
+    """
+    card_number = str(card_number or '').strip().upper()
+    try:
+        return str(int(card_number))
+    except ValueError:
+        return card_number
+
+
+def card_sort_key(card_number) -> int:
+    """
+    Numeric sort key of a card number, its last group of digits
+    (e.g. "078" -> 78, "OP08-001" -> 1, "TG05" -> 5). 0 when it has no digits.
+    Must stay in sync with back/services/card_index.py.
+    """
+    digits = re.findall(r'\d+', str(card_number or ''))
+    return int(digits[-1]) if digits else 0
+
+
+def card_index_id(licence: str, set_id: str, card_number) -> str:
+    """
+    Build the card_index document ID of a (licence, set_id, card_number) key.
+    Must stay in sync with back/services/card_index.py.
+    """
+    return "|".join([
+        (licence or '').strip().lower(),
+        (set_id or '').strip().upper(),
+        normalize_card_number(card_number)
+    ]).replace('/', '-')
+
+
+def build_card_index(licence: str, serie_id: str, set_id: str,
+                     cards: List[Dict[str, Any]], card_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Group the cards of a serie by normalized card number into card_index documents.
+
+    Args:
+        licence: Licence of the serie
+        serie_id: Firestore ID of the serie document
+        set_id: Set id of the serie, as read on the cards
+        cards: Card documents data
+        card_ids: Firestore IDs of the card documents (same order as cards)
+
+    Returns:
+        Dictionary mapping card_index document IDs to their data
+    """
+    entries = {}
+    for card, card_id in zip(cards, card_ids):
+        doc_id = card_index_id(licence, set_id, card.get('card_number'))
+        if doc_id not in entries:
+            entries[doc_id] = {
+                'licence': licence,
+                'set_id': set_id,
+                'card_number': normalize_card_number(card.get('card_number')),
+                'series_id': serie_id,
+                'versions': []
+            }
+        entries[doc_id]['versions'].append({
+            **card,
+            '_id': card_id,
+            'ref': f"series/{serie_id}/cards/{card_id}"
+        })
+    return entries
+
+
+def write_card_index(firestore_service, licence: str, serie_id: str, set_id: str,
+                     cards: List[Dict[str, Any]], card_ids: List[str]) -> int:
+    """
+    Write the card_index documents of a serie with a bulk writer.
+
+    Returns:
+        Number of card_index documents written
+    """
+    entries = build_card_index(licence, serie_id, set_id, cards, card_ids)
+    written = firestore_service.batch_set_documents(
+        CARD_INDEX_COLLECTION,
+        list(entries.values()),
+        list(entries)
+    )
+    return len(written)
@@ -0,0 +1,27 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Max pages scraped at once, also the size of the connection pool
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', '8'))
+SCRAPE_TIMEOUT = float(os.getenv('SCRAPE_TIMEOUT', '30'))
+
+
+def create_session() -> requests.Session:
+    """
+    HTTP session reusing its connections, with retries on rate limits and server errors
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=SCRAPE_CONCURRENCY,
+        pool_maxsize=SCRAPE_CONCURRENCY,
+        max_retries=Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+session = create_session()
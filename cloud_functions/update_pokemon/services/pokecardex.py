@@ -0,0 +1,76 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from lxml import html
+from lxml.cssselect import CSSSelector
+
+from services.card_index import card_sort_key
+
+# Selectors are compiled to XPath once, at import time
+SERIE_CONTAINER = CSSSelector('div.serie-container')
+SERIE_SYMBOL = CSSSelector('img.symbole-jp')
+SERIE_LOGO = CSSSelector('img.serie-logo-jp')
+RELEASE_DATE = CSSSelector('div.d-flex.align-items-center.d-none.d-lg-block.justify-content-lg-start')
+CARD_IMAGE = CSSSelector('img.img-fluid.br-10.dark-shadow')
+
+
+def _file_stem(url: Optional[str]) -> Optional[str]:
+    """
+    Filename of an URL without its extension (e.g. ".../SV6.png" -> "SV6")
+    """
+    if not url:
+        return None
+    return os.path.splitext(os.path.basename(url))[0]
+
+
+def parse_series(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse the series list page (https://www.pokecardex.com/series/jp)
+    """
+    document = html.fromstring(text)
+    series = []
+    for container in SERIE_CONTAINER(document):
+        symbol = SERIE_SYMBOL(container)
+        logo = SERIE_LOGO(container)
+        if not symbol:
+            continue
+
+        symbol_img = symbol[0].get('src')
+        series.append({
+            'set_id': _file_stem(symbol_img),
+            'symbol_img': symbol_img,
+            'serie_name': symbol[0].get('alt'),
+            'serie_logo': logo[0].get('src') if logo else None,
+            'licence': 'pokemon'
+        })
+    return series
+
+
+def parse_serie_page(text: str, serie: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Parse the page of a serie: sets its release date on serie and returns its cards
+    """
+    document = html.fromstring(text)
+
+    date = RELEASE_DATE(document)
+    if date:
+        date_text = date[0].text_content().strip()
+        try:
+            # Firestore will convert this to a timestamp
+            serie['date'] = datetime.strptime(date_text, "%d/%m/%Y")
+        except ValueError:
+            # Fallback if parsing fails
+            serie['date'] = date_text
+
+    cards = []
+    for image in CARD_IMAGE(document):
+        card_number = _file_stem(image.get('src'))
+        cards.append({
+            'card_name': image.get('alt'),
+            'card_img': image.get('src'),
+            'card_number': card_number,
+            'int_number': card_sort_key(card_number),
+            'set_id': serie.get('set_id')
+        })
+    return cards
@@ -0,0 +1,42 @@
+import os
+from datetime import datetime
+
+from services.pokecardex import parse_serie_page, parse_series
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def test_parse_series():
+    series = parse_series(read_fixture('pokecardex_series.html'))
+
+    assert len(series) == 67
+    assert series[0] == {
+        'set_id': 'SV11',
+        'symbol_img': 'https://www.pokecardex.com/assets/images/symboles/jp/SV11.png',
+        'serie_name': 'Set Spécial Écarlate & Violet 11',
+        'serie_logo': 'https://www.pokecardex.com/assets/images/logos/jp/SV11.png',
+        'licence': 'pokemon'
+    }
+
+
+def test_parse_serie_page():
+    serie = {'set_id': 'SV6'}
+
+    cards = parse_serie_page(read_fixture('pokecardex_serie.html'), serie)
+
+    assert serie['date'] == datetime(2024, 4, 26)
+    assert len(cards) == 120
+    assert cards[0] == {
+        'card_name': 'Herbizarre',
+        'card_img': 'https://www.pokecardex.com/assets/images/sets_jp/SV6/HD/001.jpg',
+        'card_number': '001',
+        'int_number': 1,
+        'set_id': 'SV6'
+    }
+    assert cards[-1]['card_number'] == 'SV-P'
+    assert cards[-1]['int_number'] == 0
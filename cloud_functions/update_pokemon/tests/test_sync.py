@@ -0,0 +1,127 @@
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+
+from services import sync
+from services.card_index import card_sort_key
+from services.sync import card_hash, diff_cards, sync_serie_cards
+
+db = firestore.Client(project='test', credentials=AnonymousCredentials(), database='test')
+
+
+def stored_card(card_id, card, **extra):
+    return {
+        **card,
+        'content_hash': card_hash(card),
+        '_id': card_id,
+        'ref': db.document(f"series/s1/cards/{card_id}"),
+        **extra
+    }
+
+
+def card(number, name='Pikachu'):
+    return {
+        'card_name': name,
+        'card_img': f"https://img/{number}.jpg",
+        'card_number': number,
+        'int_number': card_sort_key(number),
+        'set_id': 'SV6'
+    }
+
+
+class FakeFirestoreService:
+    """
+    Firestore service holding the stored cards of one serie and recording the writes
+    """
+
+    def __init__(self, stored, failures=()):
+        self.db = db
+        self.stored = stored
+        self.failures = list(failures)
+        self.operations = []
+        self.updated = {}
+
+    def query_sub_collection(self, collection_name, document_id, sub_collection):
+        return self.stored
+
+    def bulk_write(self, operations):
+        self.operations = operations
+        return self.failures
+
+    def batch_set_documents(self, collection_name, documents_data, document_ids):
+        return document_ids
+
+    def delete_document(self, collection_name, document_id):
+        return True
+
+    def update_document(self, collection_name, document_id, data):
+        self.updated = data
+        return True
+
+
+def test_card_hash_only_depends_on_imported_fields():
+    assert card_hash(card('001')) == card_hash({**card('001'), '_id': 'x', 'removed': True})
+    assert card_hash(card('001')) != card_hash(card('001', name='Raichu'))
+
+
+def test_diff_cards():
+    stored = [
+        stored_card('a', card('001')),
+        stored_card('b', card('002')),
+        stored_card('b2', card('002')),
+        stored_card('c', card('003')),
+        stored_card('d', card('004'), removed=True),
+    ]
+    cards = [card('001'), card('002', name='Raichu'), card('004'), card('005'), card('005')]
+    for c in cards:
+        c['content_hash'] = card_hash(c)
+
+    inserts, updates, deletes = diff_cards(stored, cards)
+
+    assert [c['card_number'] for c in inserts] == ['005']
+    # Changed content, and a card back in the source after being flagged as removed
+    assert [(s['_id'], c['card_name']) for s, c in updates] == [('b', 'Raichu'), ('d', 'Pikachu')]
+    assert sorted(s['_id'] for s in deletes) == ['b2', 'c']
+
+
+def test_cards_held_in_a_collection_are_flagged_instead_of_deleted(monkeypatch):
+    stored = [
+        stored_card('a', card('001')),
+        stored_card('b', card('002')),
+        stored_card('c', card('003')),
+        stored_card('d', card('004'), removed=True),
+    ]
+    monkeypatch.setattr(
+        sync, 'referenced_card_paths',
+        lambda firestore_service, card_refs: {'series/s1/cards/c', 'series/s1/cards/d'}
+    )
+    service = FakeFirestoreService(stored)
+
+    summary = sync_serie_cards(service, 'pokemon', 's1', 'SV6', [card('001')])
+
+    assert summary == {'inserted': 0, 'updated': 0, 'deleted': 1, 'kept': 2, 'unchanged': 1, 'failed': 0}
+    # Only the card not flagged yet is written
+    assert [(operation, ref.path, data) for operation, ref, data in service.operations] == [
+        ('delete', 'series/s1/cards/b', None),
+        ('merge', 'series/s1/cards/c', {'removed': True}),
+    ]
+    # Kept cards are still listed by the back end, so they count in the serie
+    assert service.updated == {'card_count': 3}
+
+
+def test_failed_writes_are_reported(monkeypatch):
+    monkeypatch.setattr(sync, 'referenced_card_paths', lambda firestore_service, card_refs: set())
+    service = FakeFirestoreService([], failures=[{'path': 'series/s1/cards/x', 'code': 10, 'message': 'aborted'}])
+
+    summary = sync_serie_cards(service, 'pokemon', 's1', 'SV6', [card('001')])
+
+    assert summary['inserted'] == 1
+    assert summary['failed'] == 1
+
+
+def test_empty_import_is_ignored():
+    service = FakeFirestoreService([stored_card('a', card('001'))])
+
+    summary = sync_serie_cards(service, 'pokemon', 's1', 'SV6', [])
+
+    assert summary['deleted'] == 0
+    assert service.operations == []